@@ -6,7 +6,7 @@ import re
 import pywikibot
 import mwparserfromhell
 from pywikibot import xmlreader
-from checkwiki import ignore, deignore
+from masking import ignore, deignore
 
 DIRECTORY = "/public/dumps/public/ruwiki/"
 FILENAME = "/public/dumps/public/ruwiki/{date}/ruwiki-{date}-pages-meta-current.xml.bz2"
@@ -7,7 +7,7 @@ Using as script:
     python checkwiki.py [keys_or_params ...]
 Keys changes bot condition, so next parameters will be processed with another
 rules.
-There are 6 available keys:
+There are 9 available keys:
     --maj: send fixed page only if it have at least one major fix [default]
     --min: send fixed page if it have at least one fix (maybe minor)
     --p: next parameters are titles of the Wikipedia pages [default]
@@ -15,9 +15,19 @@ There are 6 available keys:
     --s: next parameters are numbers of the errors which is neccessary to fix
          (make sure they're major or --min flag is used)
     --t: also process test page (see TEST_PAGE constant)
+    --jobs N: fix pages from next files and server lists in N worker processes
+    --dump PATH: fix pages from XML dump without saving them and write the ones
+         which need saving into CANDIDATES_FILE; use "latest" as PATH for the
+         newest ToolForge dump
+    --c: next parameters are names of the files written by --dump; only pages
+         which weren't edited since the dump will be fixed
 For example:
     python checkwiki.py Example1 Example2 --f pages.txt
 Process "Example1" and "Example2" pages and all pages from "pages.txt" file.
+    python checkwiki.py --jobs 4 --s 2 3
+Fix pages from the 2nd and 3rd errors lists using 4 processes.
+    python checkwiki.py --jobs 4 --dump latest --c checkwiki_candidates.tsv
+Scan the newest dump, then fix pages found there.
 
 Using as module...
 ... on high level:
@@ -46,12 +56,32 @@ See process_page() function help for more information.
 See the corresponding functions help for more information.
 """
 
+import os
 import re
 import sys
-from urllib.parse import unquote, urlencode
-from urllib.request import urlopen
-
+import time
+import queue
+import atexit
+import signal
+import json
+import heapq
+import types
+import sqlite3
+import hashlib
+import functools
+import itertools
+import threading
+import multiprocessing
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+import requests
 import pywikibot
+from pywikibot import xmlreader
+from pywikibot.data import api
+
+from masking import IGNORE_FILTER, ignore, deignore, Mask
 
 HELP_STRING = __doc__[:__doc__.index("\n\nUsing as module")]
 
@@ -75,7 +105,7 @@ WIKIPEDIAS = [
     "wa", "gd", "bug", "yi", "am", "map-bms", "si", "fo", "mzn", "or", "li", "sah", "hsb", "vec",
     "sa", "os", "ilo", "mai", "mrj"
 ]
-INTERWIKI = r"(?:{})".format(r"|".join(WIKIPEDIAS))
+# WIKIPEDIAS are compiled into INTERWIKI regexp (see #common section)
 
 IMAGE = r"(?:файл|file|изображение|image)\s*:"
 CATEGORY = r"(?:категория|к|category)\s*:"
@@ -96,27 +126,52 @@ LOCAL_MINOR_FIXES = [
     (r"{{\s*(?:[Уу]дар|[Уу]дарение|[Ss]tress|')\s*}}", "\u0301")
 ]
 
-IGNORE_FILTER = re.compile(r"""(
-    <!--.*?-->|
-
-    <nowiki>.*?</nowiki>|
-    <nowiki\s*/>|
-
-    <math>.*?</math>|
-    <hiero>.*?</hiero>|
-
-    <tt>.*?</tt>|
-    <code>.*?</code>|
-    <pre>.*?</pre>|
-    <source[^>]*>.*?</source>|
-    <syntaxhighlight[^>]*>.*?</syntaxhighlight>|
-
-    <templatedata>.*?</templatedata>|
-    <imagemap>.*?</imagemap>
-)""", re.I | re.DOTALL | re.VERBOSE)
-
+# text parts which must be left untouched are listed in masking.IGNORE_FILTER
 # also see ENABLED_ERRORS and MAJOR_ERRORS lists in #main section
 
+# number of pages requested from the server at once (up to 500 for bots)
+PRELOAD_GROUPSIZE = 50
+
+# CheckWiki web interface requests: timeout (seconds), retries count and first retry delay
+# (seconds, doubled for every next retry), maximum number of mark requests sent at once
+REQUEST_TIMEOUT = 60
+REQUEST_RETRIES = 3
+REQUEST_BACKOFF = 1
+MARK_CONCURRENCY = 8
+# file name of the journal of not yet confirmed marks, see CheckWikiClient class
+MARK_JOURNAL = None
+
+# size of the queues between the stages of process_list() pipeline
+PIPELINE_QUEUE_SIZE = 50
+# number of threads saving pages and marking errors in process_list()
+SAVE_WORKERS = 1
+MARK_WORKERS = 1
+
+# number of pages loaded in advance for every worker process in process_texts()
+JOB_WINDOW = 4
+
+# maximum time (in seconds) of one fixer call for one page, see TimeBudget class; 0 means no limit
+RULE_TIME_LIMIT = 10
+
+# fixers statistics (see FixerStats class): if COLLECT_STATS is True, process_list() collects it
+# and writes to STATS_FILE as JSON or prints as a table if STATS_FILE is None;
+# SLOW_PAGES is a number of the slowest pages to remember
+COLLECT_STATS = False
+STATS_FILE = None
+SLOW_PAGES = 10
+
+# maximum number of remembered results of every link normalization function (see LINK_CACHES)
+LINK_CACHE_SIZE = 10000
+# number of texts which tags are remembered by scan_tags()
+TAG_CACHE_SIZE = 16
+
+# file name of the on-disk cache of process_text() results, see ResultCache class
+RESULT_CACHE = None
+
+# dump mode: namespaces of the pages to be checked and the file candidates are written to
+DUMP_NAMESPACES = ["0"]
+CANDIDATES_FILE = "checkwiki_candidates.tsv"
+
 FIX_UNSAFE_EXTLINKS = False
 FIX_UNSAFE_MISSING_REFERENCES = False
 
@@ -141,6 +196,42 @@ def allsub(pattern, repl, string, count=0, flags=0):
     """Works just as re.sub, but works until there is no matches left."""
     return allsubn(pattern, repl, string, count=count, flags=flags)[0]
 
+def trie_regexp(words):
+    """
+    Return regexp (without capturing groups) matching any of the words, built as
+    a prefix tree: "b(?:e(?:-tarask)?|[ag])" for ["ba", "be", "be-tarask", "bg"].
+    Unlike plain "ba|be|be-tarask|bg" alternation, it checks every symbol of the
+    text only once per position, not once per word.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def _build(node):
+        """Return regexp for the subtree."""
+        optional = "" in node
+        leaves = []
+        branches = []
+        for (char, child) in sorted(item for item in node.items() if item[0] != ""):
+            if list(child) == [""]:
+                leaves.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + _build(child))
+        if len(leaves) == 1:
+            branches.append(leaves[0])
+        elif leaves:
+            branches.append("[" + "".join(leaves) + "]")
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return _build(trie)
+
 def unique(lst):
     """Return the list without element dublication; element's order might be broken."""
     return list(set(lst))
@@ -149,63 +240,107 @@ def count_ignore_case(string, substring):
     """count_ignore_case(s1, s2) works just as s1.count(s2), but ignores case."""
     return string.lower().count(substring.lower())
 
-# common
-
-LABEL_PREFIX = "\x01"
-LABEL_SUFFIX = "\x02"
-
-def ignore(text, ignore_filter=IGNORE_FILTER):
+class Pipeline(object):
     """
-    Replace all text matches regexp with special label.
-
-    Parameters:
-        text - text to be processed;
-        ignore_filter - compiled regular expression or string with regexp.
-
-    Return (new_text, deleted_text_list) tuple.
+    Multithreaded pipeline: items from the source iterable go through the
+    stages one by one, every stage is served by its own worker threads, and
+    the stages are connected with bounded queues.
+
+    Usage:
+        pipeline = Pipeline(source)
+        pipeline.add_stage(function, workers=1)
+        ...
+        pipeline.run()
+    Every stage function gets an item from the previous stage and returns an
+    item for the next one; None result drops the item.
     """
-    if isinstance(ignore_filter, str):
-        ignore_filter = re.compile(ignore_filter, flags=re.I | re.DOTALL)
 
-    ignored = []
-    count = 0
-
-    def _ignore_line(match_obj):
-        """Replace founded text with special label."""
-        #pylint: disable=undefined-variable
-        nonlocal ignored
-        ignored.append(match_obj.group(0))
-
-        nonlocal count
-        old_count = count
-        count += 1
-        return LABEL_PREFIX + str(old_count) + LABEL_SUFFIX
-
-    text = re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _ignore_line, text)
-    text = ignore_filter.sub(_ignore_line, text)
-    return (text, ignored)
-
-def deignore(text, ignored):
-    """
-    Restore the text returned by the ignore() function.
+    _STOP = object()
+
+    def __init__(self, source, queue_size=PIPELINE_QUEUE_SIZE):
+        """Initialize the pipeline with the source iterable and size of every queue."""
+        self.source = source
+        self.queue_size = queue_size
+        self.stages = []
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_stage(self, function, workers=1):
+        """Add a stage, served by the given number of threads, to the end of the pipeline."""
+        self.stages.append((function, max(workers, 1)))
+
+    def _worker(self, index, input_queue, output_queue, finished):
+        """Serve index-th stage until the stop signal is received."""
+        (function, _) = self.stages[index]
+        while True:
+            item = input_queue.get()
+            if item is self._STOP:
+                break
+            try:
+                result = function(item)
+            except Exception as exception:
+                # keep the pipeline draining, exception will be raised by run()
+                with self._lock:
+                    if self.error is None:
+                        self.error = exception
+                continue
+            if result is not None and output_queue is not None:
+                output_queue.put(result)
+
+        with self._lock:
+            finished[index] += 1
+            last_worker = finished[index] == self.stages[index][1]
+        if last_worker and output_queue is not None:
+            for _ in range(self.stages[index + 1][1]):
+                output_queue.put(self._STOP)
+
+    def run(self):
+        """
+        Feed all the source items to the pipeline and wait until every stage
+        is finished. Source is iterated in the current thread.
+        Reraise the first exception raised by a stage function, if any.
+        """
+        if self.stages == []:
+            for _ in self.source:
+                pass
+            return
+
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        queues.append(None)
+        finished = [0] * len(self.stages)
+        threads = []
+        for index, (_, workers) in enumerate(self.stages):
+            for _ in range(workers):
+                thread = threading.Thread(target=self._worker,
+                                          args=(index, queues[index], queues[index + 1], finished))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in self.source:
+                queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0][1]):
+                queues[0].put(self._STOP)
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
 
-    Parameters:
-        text - text to be processed;
-        ignored - deleted_text_list, returned by the ignore() function.
+# common
 
-    Return string.
-    """
-    def _deignore_line(match_obj):
-        """Replace founded label with corresponding text."""
-        index = int(match_obj.group(1))
-        return ignored[index]
+INTERWIKI = r"(?:{})".format(trie_regexp(WIKIPEDIAS))
 
-    return re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _deignore_line, text)
+WHITESPACE_REGEXP = re.compile(r"[_ ]+")
 
+@functools.lru_cache(maxsize=LINK_CACHE_SIZE)
 def process_link_whitespace(link):
     """Replace "_" symbols with spaces, delete leading spaces."""
-    return re.sub(r"[_ ]+", " ", link).strip()
+    return WHITESPACE_REGEXP.sub(" ", link).strip()
 
+@functools.lru_cache(maxsize=LINK_CACHE_SIZE)
 def unificate_link(link):
     """Process whitespace, make first letter upper."""
     link = process_link_whitespace(link)
@@ -214,6 +349,7 @@ def unificate_link(link):
     else:
         return link[0].upper() + link[1:]
 
+@functools.lru_cache(maxsize=LINK_CACHE_SIZE)
 def compare_links(link1, link2):
     """Return True if two strings refers to the same Wikipedia article."""
     if link1 is None or link2 is None:
@@ -223,9 +359,17 @@ def compare_links(link1, link2):
 
 DATE_REGEXP = r"(?:0?[1-9]|[12]\d|3[01])\.(?:0?[1-9]|1[0-2])\.\d{4}"
 
+ENCODED_LINK_REGEXP = re.compile(r"%|\.[0-9A-F]{2}")
+
+@functools.lru_cache(maxsize=LINK_CACHE_SIZE)
 def decode_link(link):
     """Decode encoded links, such as "%D0%A1#.D0.B2"."""
     new_link = process_link_whitespace(link)
+    if ENCODED_LINK_REGEXP.search(new_link) is None:
+        # nothing to decode
+        if "\ufffd" in new_link:
+            return (link, False)
+        return (new_link, True)
 
     (new_link, ignored) = ignore(new_link, DATE_REGEXP)
     new_link = allsub(r"(#.*?)\.([0-9A-F]{2})", "\\1%\\2", new_link)
@@ -239,6 +383,13 @@ def decode_link(link):
     else:
         return (new_link, True)
 
+# functions with the results cached in memory, see link_cache_info()
+LINK_CACHES = (process_link_whitespace, unificate_link, compare_links, decode_link)
+
+def link_cache_info():
+    """Return {function_name: (hits, misses)} dict for the functions from LINK_CACHES."""
+    return {function.__name__: tuple(function.cache_info()[:2]) for function in LINK_CACHES}
+
 def process_external_link(match_obj):
     """
     Convert external link to a wiki-link.
@@ -276,30 +427,80 @@ def process_external_link(match_obj):
     else:
         return "[[" + code + link + "|" + link + "]]"
 
+@functools.lru_cache(maxsize=None)
+def compile_external_link_regexps(lang_code):
+    """
+    Return list of compiled regexps of external links to wikipedia on the language,
+    matching lang_code regexp, for process_link_as_external().
+    """
+    lang_code = "(" + lang_code + ")"
+    prefix = r"\[(?:https?:)?//{}\.(?:m\.)?wikipedia\.org/(?:w|wiki)/".format(lang_code)
+    suffix = r"\]"
+
+    regexps = [
+        prefix + r"([^\[\]|?=]+)\|([^\[\]|]+)" + suffix, # [wp/Example Article|text]
+        prefix + r"([^\[\]| ?=]+) ([^\[\]|]+)" + suffix # [wp/Example_Article text]
+    ]
+    if FIX_UNSAFE_EXTLINKS:
+        regexps.append(prefix + r"([^\[\]|?=]+)" + suffix) # [wp/Example_Article]
+    return [re.compile(regexp, flags=re.I) for regexp in regexps]
+
 def process_link_as_external(text, lang_code=LANG_CODE):
     """
     Replace all links to wikipedia on the language, matching lang_code regexp,
     with a wikilinks.
     Used in 90th and 91st errors.
     """
-    lang_code = "(" + lang_code + ")"
-    prefix = r"\[(?:https?:)?//{}\.(?:m\.)?wikipedia\.org/(?:w|wiki)/".format(lang_code)
-    suffix = r"\]"
+    count = 0
 
-    count_before = len(re.findall(prefix, text))
+    def _process_link(match_obj):
+        """Convert the link and count it if it was converted."""
+        nonlocal count
+        result = process_external_link(match_obj)
+        if result != match_obj.group(0):
+            count += 1
+        return result
 
-    exp1 = prefix + r"([^\[\]|?=]+)\|([^\[\]|]+)" + suffix # [wp/Example Article|text]
-    text = re.sub(exp1, process_external_link, text, flags=re.I)
-    exp2 = prefix + r"([^\[\]| ?=]+) ([^\[\]|]+)" + suffix # [wp/Example_Article text]
-    text = re.sub(exp2, process_external_link, text, flags=re.I)
+    for regexp in compile_external_link_regexps(lang_code):
+        text = regexp.sub(_process_link, text)
+    return (text, count)
 
-    if FIX_UNSAFE_EXTLINKS:
-        exp3 = prefix + r"([^\[\]|?=]+)" + suffix # [wp/Example_Article]
-        text = re.sub(exp3, process_external_link, text, flags=re.I)
+TAG_REGEXP = re.compile(r"<(/?)\s*(\w+)\b[^<>]*?>")
 
-    count_after = len(re.findall(prefix, text))
+@functools.lru_cache(maxsize=TAG_CACHE_SIZE)
+def scan_tags(text):
+    """
+    Find tags of all names in one pass over the text.
+    Return {tag_name_in_lower_case: tuple_of_booleans} dict, True for opening tags
+    and False for closing ones. Result is cached, so it must not be changed.
+    """
+    tags = {}
+    for match in TAG_REGEXP.finditer(text):
+        tags.setdefault(match.group(2).lower(), []).append(match.group(1) == "")
+    return {name: tuple(sequence) for (name, sequence) in tags.items()}
+
+def check_tags_balance(text, tags, recursive=False):
+    """
+    Check if all tags of every name from the list have a pair. Return True if yes, otherwise False.
+    tags parameter must contains only names of the tags, for example, ["b", "i"] for <b> and <i>.
+    recursive flag must be True if nested tags are correct. The default value is False.
+    """
+    scanned = scan_tags(text)
+    for tag in tags:
+        balance = 0
+        for opening in scanned.get(tag.lower(), ()):
+            if opening:
+                balance += 1
+            else:
+                balance -= 1
+            if balance < 0:
+                return False
+            if not recursive and balance > 1:
+                return False
+        if balance != 0:
+            return False
 
-    return (text, count_before - count_after)
+    return True
 
 def check_tag_balance(text, tag, recursive=False):
     """
@@ -307,23 +508,7 @@ def check_tag_balance(text, tag, recursive=False):
     tag parameter must contains only name of the tag, for example, "b" for <b>.
     recursive flag must be True if nested tags are correct. The default value is False.
     """
-    tags = re.findall(r"<(/?)\s*{}\b[^<>]*?>".format(tag), text, flags=re.I)
-    tags = [cur_tag == "" for cur_tag in tags] # True for opening, False for closing
-
-    balance = 0
-    for cur_tag in tags:
-        if cur_tag:
-            balance += 1
-        else:
-            balance -= 1
-        if balance < 0:
-            return False
-        if not recursive and balance > 1:
-            return False
-    if balance != 0:
-        return False
-
-    return True
+    return check_tags_balance(text, [tag], recursive)
 
 def fix_unpair_tag(text, tag, count_selfclosing=True):
     """
@@ -358,6 +543,8 @@ def fix_pair_tag(text, tag, recursive=False):
     (text, fixed1) = re.subn(r"<[ ]*{}[ ]*[/\\]>".format(tag), correct_tag, text, flags=re.I)
     (text, fixed2) = re.subn(r"<\\[ ]*{}[ ]*>".format(tag), correct_tag, text, flags=re.I)
 
+    if fixed1 + fixed2 == 0:
+        return (text, 0)
     if check_tag_balance(text, tag, recursive):
         return (text, fixed1 + fixed2)
     else:
@@ -424,8 +611,146 @@ def insert_references(text, last_ref=0):
 
     return (text, 0)
 
+# single character fixes of error 16 made with str.translate()
+CONTROL_CHARACTERS = {
+    "\uFEFF": "", "\u200B": "", "\u2028": "", "\u202A": "", "\u202C": "", "\u202D": "",
+    "\u202E": "", "\u2004": " ", "\u2005": " ", "\u2006": " ", "\u2007": " ", "\u2008": " "
+}
+CONTROL_CHARACTERS_TABLE = str.maketrans(CONTROL_CHARACTERS)
+
+# fixes of error 27, made with str.replace() outside external links
+MNEMONIC_CODES = {"&#8211;": "–", "&#x20;": " "}
+URL_REGEXP = re.compile(r"https?://\S+")
+
+MNEMONIC_DASHES = [(re.compile("&ndash;", flags=re.I), "–"), (re.compile("&mdash;", flags=re.I), "—")]
+STRIKE_REGEXP = re.compile(r"(</?)strike>", flags=re.I)
+
+NAMESPACE_FIXES = [
+    (re.compile(r"(\[\[:?)" + CATEGORY + r"(\s*)", flags=re.I), "\\1Категория:"),
+    (re.compile(r"(\[\[:?)" + MODULE   + r"(\s*)", flags=re.I), "\\1Модуль:"),
+    (re.compile(r"(\[\[:?)" + TEMPLATE + r"(\s*)", flags=re.I), "\\1Шаблон:"),
+    (re.compile(r"(\[\[:?)" + IMAGE    + r"(\s*)", flags=re.I), "\\1Файл:")
+]
+
+# token kinds
+
+# the text is scanned once only to learn which kinds of markup it has (see ERROR_TOKENS);
+# fixers don't share a list of lexed tokens, because every fixer changes the text and
+# token offsets would have to be recalculated after it anyway
+
+# finder of the opening markup (tokens) of wiki elements, every group name is a token kind
+TOKEN_FINDER = re.compile(r"""(?=[\[{{<=&h])(?:
+    (?P<category>\[\[\s*{category})|
+    (?P<wikilink>\[\[)|
+    (?P<template>{{{{)|
+    (?P<tag><[/\\ ]*[a-z])|
+    (?P<heading>^=)(?=.*=$)|
+    (?P<extlink>https?:|\[//)|
+    (?P<entity>&\#?\w+;)
+)""".format(category=CATEGORY), re.I | re.M | re.VERBOSE)
+
+TOKEN_KINDS = frozenset(TOKEN_FINDER.groupindex)
+
+def token_kinds(text):
+    """
+    Scan the text once and return set of token kinds (see TOKEN_KINDS) found in
+    it: "category", "wikilink", "template", "tag", "heading", "extlink" or "entity".
+    Stops scanning as soon as every kind is found.
+    """
+    kinds = set()
+    for match in TOKEN_FINDER.finditer(text):
+        kinds.add(match.lastgroup)
+        if len(kinds) == len(TOKEN_KINDS):
+            break
+    return kinds
+
+def compile_literals(literals):
+    """
+    Compile case-insensitive multi-literal finder for find_literals() function.
+    Return (regexp, prefixes) tuple, where prefixes is a dict, which maps every
+    literal (in lower case) to the set of literals it starts with.
+    """
+    literals = sorted({literal.lower() for literal in literals}, key=len, reverse=True)
+    # the longest alternatives go first, so shorter ones could be restored from prefixes;
+    # first letters lookahead lets regexp engine skip most of the positions quickly
+    first_letters = "".join(sorted({re.escape(literal[0]) for literal in literals}))
+    alternatives = "|".join(re.escape(literal) for literal in literals)
+    regexp = re.compile(r"(?=[{}])(?=({}))".format(first_letters, alternatives), flags=re.I)
+    prefixes = {}
+    for literal in literals:
+        prefixes[literal] = {prefix for prefix in literals if literal.startswith(prefix)}
+    return (regexp, prefixes)
+
+def find_literals(text, compiled):
+    """
+    Scan the text once and return set of found literals (in lower case).
+    compiled parameter is a tuple, returned by compile_literals() function.
+    Overlapping literals are found too.
+    """
+    (regexp, prefixes) = compiled
+    found = set()
+    for match in regexp.finditer(text):
+        literal = match.group(1).lower()
+        if literal not in prefixes:
+            # some symbols match case insensitive, but are lowered to something else (like "İ"
+            # or "ſ"); named groups would tell the literal, but make the scan several times slower
+            literal = next(literal for literal in prefixes
+                           if re.fullmatch(re.escape(literal), match.group(1), flags=re.I))
+        found.update(prefixes[literal])
+        if len(found) == len(prefixes):
+            break
+    return found
+
+class TextFeatures(object):
+    """
+    Lazily collected token kinds and trigger literals of the text, used by
+    process_text() to skip fixers which can't change anything.
+
+    After the text is changed, features found earlier are kept: it's safe to
+    call an extra fixer, so the text is scanned again only if some fixer would
+    be skipped otherwise.
+    """
+
+    def __init__(self, text, literals):
+        """Initialize features for the text; literals is a result of compile_literals()."""
+        self.text = text
+        self.compiled_literals = literals
+        self.kinds = set()
+        self.kinds_actual = False
+        self.literals = set()
+        self.literals_actual = False
+
+    def update(self, text):
+        """Notify that the text was changed by a fixer."""
+        if text != self.text:
+            self.text = text
+            self.kinds_actual = False
+            self.literals_actual = False
+
+    def has_kinds(self, kinds):
+        """Return True if one of the token kinds may be found in the text."""
+        if self.kinds.isdisjoint(kinds) and not self.kinds_actual:
+            self.kinds = token_kinds(self.text)
+            self.kinds_actual = True
+        return not self.kinds.isdisjoint(kinds)
+
+    def has_literals(self, literals):
+        """Return True if one of the literals (in lower case) may be found in the text."""
+        if self.literals.isdisjoint(literals) and not self.literals_actual:
+            self.literals = find_literals(self.text, self.compiled_literals)
+            self.literals_actual = True
+        return not self.literals.isdisjoint(literals)
+
 # errors
 
+def uses_context(function):
+    """
+    Decorator of the fixers which take FixContext as the second argument
+    (see process_text()).
+    """
+    function.uses_context = True
+    return function
+
 def error_001_template_with_keyword(text):
     """Fix the error and return (new_text, replacements_count) tuple."""
     return re.subn(r"{{" + TEMPLATE + r"\s*", "{{", text, flags=re.I)
@@ -464,9 +789,10 @@ def error_016_control_characters(text):
     One of the regexps is copied from wikificator.
     """
     (text, count1) = allsubn(r"(\[\[[^|\[\]]*)[\u00AD\u200E\u200F]+([^\[\]]*\]\])", "\\1\\2", text)
-    (text, count2) = re.subn(r"[\uFEFF\u200B\u2028\u202A\u202C\u202D\u202E]", "", text)
-    (text, count3) = re.subn(r"[\u2004\u2005\u2006\u2007\u2008]", " ", text)
-    return (text, count1 + count2 + count3)
+    count2 = sum(text.count(char) for char in CONTROL_CHARACTERS)
+    if count2 > 0:
+        text = text.translate(CONTROL_CHARACTERS_TABLE)
+    return (text, count1 + count2)
 
 def error_017_category_dublicate(text):
     """
@@ -475,41 +801,28 @@ def error_017_category_dublicate(text):
     """
     regexp = r"\[\[категория:([^|\[\]\n]+)(?:\|([^|\[\]\n]*))?\]\]\n?"
     category_finder = re.compile(regexp, flags=re.I)
-    category_list = category_finder.findall(text)
-
-    def need_to_delete(match_obj, category_list, cur_cat):
-        """Return true if it's neccessary to delete founded category."""
-        name = match_obj.group(1)
-        key = match_obj.group(2)
-        if key is None:
-            key = ""
-
-        cur_len = len(key)
-        for i, category in enumerate(category_list):
-            if compare_links(name, category[0]):
-                candidate_len = len(category[1])
-                if candidate_len > cur_len or candidate_len == cur_len and i < cur_cat:
-                    return True
-        return False
-
-    count = 0
-    cur_cat = 0
-    cur_pos = 0
-    while True:
-        cur_match = category_finder.search(text[cur_pos:])
-        if cur_match is None:
-            break
+    matches = list(category_finder.finditer(text))
+
+    # index of the category to keep and its sort key length for every unificated name
+    best = {}
+    for (index, match) in enumerate(matches):
+        name = unificate_link(match.group(1))
+        key_len = len(match.group(2) or "")
+        if name not in best or key_len > best[name][1]:
+            best[name] = (index, key_len)
+
+    keep = set(index for (index, _) in best.values())
+    if len(keep) == len(matches):
+        return (text, 0)
 
-        start = cur_match.start(0)
-        end = cur_match.end(0)
-        if need_to_delete(cur_match, category_list, cur_cat):
-            text = text[:cur_pos + start] + text[cur_pos + end:]
-            count += 1
-            cur_pos += start
-        else:
-            cur_pos += end
-        cur_cat += 1
-    return (text, count)
+    result = []
+    last = 0
+    for (index, match) in enumerate(matches):
+        if index not in keep:
+            result.append(text[last:match.start(0)])
+            last = match.end(0)
+    result.append(text[last:])
+    return ("".join(result), len(matches) - len(keep))
 
 def error_021_category_in_english(text):
     """Fix the error and return (new_text, replacements_count) tuple."""
@@ -535,18 +848,26 @@ def error_026_bold_tag(text):
 
 def error_027_mnemonic_codes(text):
     """Fix some cases and return (new_text, replacements_count) tuple."""
-    (text, ignored) = ignore(text, r"https?://\S+")
-    (text, count1) = re.subn(r"&#8211;", "–", text)
-    (text, count2) = re.subn(r"&#x20;", " ", text)
-    text = deignore(text, ignored)
-    return (text, count1 + count2)
+    mask = None
+    count = 0
+    for (code, char) in MNEMONIC_CODES.items():
+        if code not in text:
+            continue
+        if mask is None:
+            mask = Mask(text, URL_REGEXP)
+        if mask:
+            (text, code_count) = mask.subn(re.escape(code), char, text)
+        else:
+            code_count = text.count(code)
+            text = text.replace(code, char)
+        count += code_count
+    return (text, count)
 
 def error_032_link_two_pipes(text):
     """Fix some cases and return (new_text, replacements_count) tuple."""
-    (text, ignored) = ignore(text, r"\[\[\s*:?\s*{}.*?\]\]".format(IMAGE))
-    (text, count1) = re.subn(r"\[\[([^|\[\]\n]+)\|\|([^|\[\]\n]+)\]\]", "[[\\1|\\2]]", text)
-    (text, count2) = re.subn(r"\[\[([^|\[\]\n]+)\|([^|\[\]\n]+)\|\]\]", "[[\\1|\\2]]", text)
-    text = deignore(text, ignored)
+    mask = Mask(text, r"\[\[\s*:?\s*{}.*?\]\]".format(IMAGE))
+    (text, count1) = mask.subn(r"\[\[([^|\[\]\n]+)\|\|([^|\[\]\n]+)\]\]", "[[\\1|\\2]]", text)
+    (text, count2) = mask.subn(r"\[\[([^|\[\]\n]+)\|([^|\[\]\n]+)\|\]\]", "[[\\1|\\2]]", text)
     return (text, count1 + count2)
 
 def error_034_template_elements(text):
@@ -564,21 +885,22 @@ def error_038_italic_tag(text):
 
 def error_042_strike_tag(text):
     """Fix the error and return (new_text, replacements_count) tuple."""
-    return re.subn(r"(</?)strike>", "\\1s>", text, flags=re.I)
+    return STRIKE_REGEXP.subn("\\1s>", text)
 
 def error_044_headline_with_bold(text):
     """Fix the error and return (new_text, replacements_count) tuple."""
     return allsubn(r"^(=+) (.*?)'''(.*?)'''(.*?) \1$", "\\1 \\2\\3\\4 \\1", text, flags=re.M)
 
-def error_048_title_link_in_text(text):
+@uses_context
+def error_048_title_link_in_text(text, context=None):
     """
     Fix the error and return (new_text, replacements_count) tuple.
-    Uses static title variable. Make sure you have set it before function call:
-        error_048_title_link_in_text.title = "Example"
+    Uses title of the page from the context (see FixContext class).
     Replaces title links with its text without bold tag.
     """
-    if error_048_title_link_in_text.title is None:
+    if context is None or context.title is None:
         return (text, 0)
+    title = context.title
 
     count = 0
 
@@ -589,7 +911,7 @@ def error_048_title_link_in_text(text):
         if name is None:
             name = link
 
-        if compare_links(link, error_048_title_link_in_text.title):
+        if compare_links(link, title):
             #pylint: disable=undefined-variable
             nonlocal count
             count += 1
@@ -600,28 +922,26 @@ def error_048_title_link_in_text(text):
     text = re.sub(r"\[\[([^\]|\n]+)(?:\|([^\]|\n]+))?\]\]", _process_link, text)
     return (text, count)
 
-error_048_title_link_in_text.title = None
-
 def error_050_mnemonic_dash(text):
     """Fix the error and return (new_text, replacements_count) tuple."""
-    (text, count1) = re.subn("&ndash;", "–", text, flags=re.I)
-    (text, count2) = re.subn("&mdash;", "—", text, flags=re.I)
-    return (text, count1 + count2)
+    count = 0
+    for (regexp, dash) in MNEMONIC_DASHES:
+        (text, dash_count) = regexp.subn(dash, text)
+        count += dash_count
+    return (text, count)
 
-def error_051_interwiki_in_text(text):
+@uses_context
+def error_051_interwiki_in_text(text, context=None):
     """
     Fix obvious cases and return (new_text, fixed_errors_count) tuple.
-
-    error_051_interwiki_in_text.last_count parameter contains last returned
-    replacements_count value.
+    Replacements count is also saved in the context state for error_053.
     """
     regexp = r"(\[\[)({}):[ ]*([^\[\]|\n]+\|[^\[\]|\n]+\]\])".format(INTERWIKI)
     (text, count) = re.subn(regexp, "\\1:\\2:\\3", text, flags=re.I)
-    error_051_interwiki_in_text.last_count = count
+    if context is not None:
+        context.state["051"] = count
     return (text, count)
 
-error_051_interwiki_in_text.last_count = 0
-
 def error_052_category_in_article(text):
     """Fix all wrong categories and return (new_text, fixed_errors_count) tuple."""
     ignore_filter = re.compile(r"""(
@@ -629,26 +949,45 @@ def error_052_category_in_article(text):
         <onlyinclude>.*?</onlyinclude>|
         <includeonly>.*?</includeonly>
     )""", re.I | re.DOTALL | re.VERBOSE)
-    (text, ignored) = ignore(text, ignore_filter)
-
-    category_finder = r"\[\[Категория:[^\[\]\n]+\]\][ ]*\n"
-    wrong_category_finder = category_finder + "(?=.*\n==)"
-
-    # count wrong categories
+    mask = Mask(text, ignore_filter)
     text = text + "\n"
-    count = len(re.findall(wrong_category_finder, text, flags=re.DOTALL))
 
-    # fix (all)
-    category_finder = re.compile(category_finder)
-    categories = category_finder.findall(text)
-    text = category_finder.sub("", text)
+    # categories placed before the last header are wrong
+    last_header = len(text)
+    while True:
+        last_header = text.rfind("\n==", 0, last_header)
+        if last_header == -1 or not mask.overlaps(last_header, last_header + 3):
+            break
 
-    text = deignore(text, ignored)
+    # fix (all)
+    category_finder = re.compile(r"\[\[Категория:[^\[\]\n]+\]\][ ]*\n")
+    categories = []
+    parts = []
+    count = 0
+    last = 0
+    for match in mask.finditer(category_finder, text):
+        categories.append(match.group(0))
+        parts.append(text[last:match.start(0)])
+        last = match.end(0)
+        if match.end(0) <= last_header:
+            count += 1
     if len(categories) == 0:
         return (text, 0)
+    parts.append(text[last:])
+    text = "".join(parts)
 
-    insert_pos = re.search(r"(?:\[\[[A-Za-z\-]{2,}:[^\[\]\n]+\]\]\s*)*$", text).start(0)
     # we must to insert categories before interwikis
+    interwiki_link = re.compile(r"\[\[[A-Za-z\-]{2,}:[^\[\]\n]+\]\]")
+    insert_pos = len(text.rstrip())
+    end = insert_pos
+    while text.endswith("]]", 0, end):
+        start = text.rfind("[[", 0, end)
+        if start == -1 or interwiki_link.fullmatch(text, start, end) is None:
+            break
+        insert_pos = start
+        end = start
+        while end > 0 and text[end - 1].isspace():
+            end -= 1
     prefix = text[:insert_pos].rstrip()
     interwikis = text[insert_pos:]
 
@@ -660,12 +999,15 @@ def error_052_category_in_article(text):
 
     return (text, count)
 
-def error_053_interwiki_in_text(text):
+@uses_context
+def error_053_interwiki_in_text(text, context=None):
     """
     This is just a placeholder which repeats the result of
     error_051_interwiki_in_text function to make 53rd error also markable.
     """
-    return (text, error_051_interwiki_in_text.last_count)
+    if context is None:
+        return (text, 0)
+    return (text, context.state.get("051", 0))
 
 def error_054_list_with_br(text):
     """Fix some cases and return (new_text, replacements_count) tuple."""
@@ -680,11 +1022,8 @@ def error_059_template_with_br(text):
     ignore_filter = re.compile(r"(\[\[.*?\]\]|{\|.*?\|})", re.DOTALL)
     # pipes can be also used in tables and wikilinks
     # we shouldn't detect these uses (expecially tables)
-    (text, ignored) = ignore(text, ignore_filter)
-    (text, count) = re.subn(r"[ ]*<br>[ ]*(?=\n?\s*(?:\||}}))", "", text)
-    text = deignore(text, ignored)
-
-    return (text, count)
+    mask = Mask(text, ignore_filter)
+    return mask.subn(r"[ ]*<br>[ ]*(?=\n?\s*(?:\||}}))", "", text)
 
 def error_062_url_without_http(text):
     """Fix the error in refs and return (new_text, replacements_count) tuple."""
@@ -768,21 +1107,19 @@ def error_068_interwiki_link(text):
 def error_069_isbn_wrong_syntax(text):
     """Fix some cases and return (new_text, replacements_count) tuple."""
     # ISBNs can be found in links and ref names
-    ignore_filter = re.compile(r"""(https?://\S+|<ref.*?>)""", re.I)
-    (text, ignored) = ignore(text, ignore_filter)
+    mask = Mask(text, re.compile(r"""(https?://\S+|<ref.*?>)""", re.I))
 
     # colon after ISBN
-    (text, count1) = re.subn(r"ISBN(?:[- ]?1[03])?\s*:\s*(\d)", "ISBN \\1", text, flags=re.I)
+    (text, count1) = mask.subn(r"ISBN(?:[- ]?1[03])?\s*:\s*(\d)", "ISBN \\1", text, flags=re.I)
     # "-" insted of space or lack of space
-    (text, count2) = re.subn(r"ISBN-?((?:[0-9X]-?){10})", "ISBN \\1", text, flags=re.I)
+    (text, count2) = mask.subn(r"ISBN-?((?:[0-9X]-?){10})", "ISBN \\1", text, flags=re.I)
     # two or more spaces
-    (text, count3) = re.subn(r"ISBN[ ]{2,}(\d)", "ISBN \\1", text, flags=re.I)
+    (text, count3) = mask.subn(r"ISBN[ ]{2,}(\d)", "ISBN \\1", text, flags=re.I)
     # "10-" or "13-" prefixes
-    (text, count4) = re.subn(r"(?:1[03]-)ISBN (\d)", "ISBN \\1", text, flags=re.I)
+    (text, count4) = mask.subn(r"(?:1[03]-)ISBN (\d)", "ISBN \\1", text, flags=re.I)
     # ISBN in lower case (minor)
-    text = re.sub(r"ISBN (\d)", "ISBN \\1", text, flags=re.I)
+    text = mask.sub(r"ISBN (\d)", "ISBN \\1", text, flags=re.I)
 
-    text = deignore(text, ignored)
     return (text, count1 + count2 + count3 + count4)
 
 def error_070_isbn_wrong_length(text):
@@ -906,10 +1243,9 @@ def minor_fixes_before(text):
     text = re.sub(r"^(\*+)([^ *#:])", "\\1 \\2", text) # spaces in lists
 
     extlink_regexp = re.compile(r"\[https?://[^\n\]]+\]", flags=re.I)
-    (text, ignored) = ignore(text, extlink_regexp)
+    mask = Mask(text, extlink_regexp)
     link_decoder = lambda x: decode_link(x.group(0))[0]
-    text = re.sub(r"\[\[[^|\[\]\n]+\|", link_decoder, text) # encoded links
-    text = deignore(text, ignored)
+    text = mask.sub(r"\[\[[^|\[\]\n]+\|", link_decoder, text) # encoded links
 
     return (text, 0)
 
@@ -918,10 +1254,8 @@ def minor_fixes_after(text):
     Fix some minor defects. This function is called after standart filters.
     Always return (new_text, 0) tuple.
     """
-    text = re.sub(r"(\[\[:?)" + CATEGORY + r"(\s*)", "\\1Категория:", text, flags=re.I)
-    text = re.sub(r"(\[\[:?)" + MODULE   + r"(\s*)", "\\1Модуль:", text, flags=re.I)
-    text = re.sub(r"(\[\[:?)" + TEMPLATE + r"(\s*)", "\\1Шаблон:", text, flags=re.I)
-    text = re.sub(r"(\[\[:?)" + IMAGE    + r"(\s*)", "\\1Файл:", text, flags=re.I)
+    for (regexp, replacement) in NAMESPACE_FIXES:
+        text = regexp.sub(replacement, text)
 
     # "_" symbols inside links
     replacer = lambda m: m.group(0).replace("_", " ")
@@ -999,6 +1333,100 @@ ENABLED_ERRORS = [
     minor_fixes_after
 ]
 
+# token kinds (see token_kinds()) every error fixer works on: fixer will be skipped if there is
+# no one of them in the text, it is a cheaper prefilter than ERROR_TRIGGERS
+# fixers which are not listed here are always called
+LINKS = ("wikilink", "category")
+ERROR_TOKENS = {
+    error_001_template_with_keyword: ("template",),
+    error_002_invalid_tags: ("tag",),
+    error_003_no_references: ("tag",),
+    error_009_category_without_br: ("category",),
+    error_017_category_dublicate: ("category",),
+    error_021_category_in_english: ("category",),
+    error_022_category_with_spaces: ("category",),
+    error_026_bold_tag: ("tag",),
+    error_027_mnemonic_codes: ("entity",),
+    error_032_link_two_pipes: LINKS,
+    error_034_template_elements: ("template",),
+    error_038_italic_tag: ("tag",),
+    error_042_strike_tag: ("tag",),
+    error_044_headline_with_bold: ("heading",),
+    error_048_title_link_in_text: LINKS,
+    error_050_mnemonic_dash: ("entity",),
+    error_051_interwiki_in_text: ("wikilink",),
+    error_052_category_in_article: ("category",),
+    error_054_list_with_br: ("tag",),
+    error_057_headline_with_colon: ("heading",),
+    error_059_template_with_br: ("tag",),
+    error_062_url_without_http: ("tag",),
+    error_063_small_tag_in_refs: ("tag",),
+    error_064_link_equal_linktext: LINKS,
+    error_065_image_desc_with_br: ("tag",),
+    error_068_interwiki_link: ("wikilink",),
+    error_080_ext_link_with_br: ("extlink",),
+    error_085_empty_tag: ("tag",),
+    error_086_ext_link_two_brackets: ("extlink",),
+    error_088_dsort_with_spaces: ("template",),
+    error_090_internal_link_as_ext: ("extlink",),
+    error_091_interwiki_link_as_ext: ("extlink",),
+    error_093_double_http: ("extlink",),
+    error_098_unclosen_sub: ("tag",),
+    error_099_unclosen_sup: ("tag",),
+    error_101_sup_in_numbers: ("tag",),
+    error_103_pipe_in_wikilink: LINKS,
+    error_104_quote_marks_in_refs: ("tag",)
+}
+
+# literals every error fixer needs (in lower case, matched case insensitive): fixer will be
+# skipped if there is no one of them in the text; fixers which are not listed here are always called
+CATEGORY_TRIGGERS = ("категория",)
+BR_TRIGGERS = ("<br>",)
+ISBN_TRIGGERS = ("isbn",)
+WIKIPEDIA_TRIGGERS = ("wikipedia.org",)
+ERROR_TRIGGERS = {
+    error_002_invalid_tags: ("br", "hr", "small", "center", "div", "span"),
+    error_003_no_references: ("<ref",),
+    error_009_category_without_br: CATEGORY_TRIGGERS,
+    error_016_control_characters: ("\u00AD", "\u200E", "\u200F") + tuple(CONTROL_CHARACTERS),
+    error_017_category_dublicate: CATEGORY_TRIGGERS,
+    error_021_category_in_english: ("category",),
+    error_022_category_with_spaces: CATEGORY_TRIGGERS,
+    error_026_bold_tag: ("<b>", "<strong>"),
+    error_027_mnemonic_codes: tuple(MNEMONIC_CODES),
+    error_032_link_two_pipes: ("||", "|]]"),
+    error_034_template_elements: ("pagename}}",),
+    error_038_italic_tag: ("<i>", "<em>"),
+    error_042_strike_tag: ("strike>",),
+    error_044_headline_with_bold: ("'''",),
+    error_050_mnemonic_dash: ("&ndash;", "&mdash;"),
+    error_052_category_in_article: CATEGORY_TRIGGERS,
+    error_054_list_with_br: BR_TRIGGERS,
+    error_057_headline_with_colon: (": =",),
+    error_059_template_with_br: BR_TRIGGERS,
+    error_062_url_without_http: ("www.",),
+    error_063_small_tag_in_refs: ("<small>",),
+    error_065_image_desc_with_br: BR_TRIGGERS,
+    error_068_interwiki_link: ("[[:",),
+    error_069_isbn_wrong_syntax: ISBN_TRIGGERS,
+    error_070_isbn_wrong_length: ISBN_TRIGGERS,
+    error_080_ext_link_with_br: ("[http",),
+    error_085_empty_tag: ("<ref>", "<center>", "<gallery", "<noinclude>", "<onlyinclude>",
+                          "<div>", "<span>"),
+    error_086_ext_link_two_brackets: ("[[http",),
+    error_088_dsort_with_spaces: ("defaultsort",),
+    error_090_internal_link_as_ext: WIKIPEDIA_TRIGGERS,
+    error_091_interwiki_link_as_ext: WIKIPEDIA_TRIGGERS,
+    error_093_double_http: ("http",),
+    error_098_unclosen_sub: ("sub",),
+    error_099_unclosen_sup: ("sup",),
+    error_101_sup_in_numbers: ("</sup>",),
+    error_103_pipe_in_wikilink: ("{{!}}",),
+    error_104_quote_marks_in_refs: ("<ref",)
+}
+
+TRIGGERS = compile_literals(literal for triggers in ERROR_TRIGGERS.values() for literal in triggers)
+
 MAJOR_ERRORS = {
     "1": "шаблонов",
     "2": "синтаксиса тегов",
@@ -1059,85 +1487,591 @@ def get_error_num(function):
         result = "0"
     return result
 
-def mark_error_done(error_num, page_name):
-    """Mark error as done in CheckWiki web interface."""
-    error_num = str(error_num)
-    if error_num == "0":
-        return
+class CheckWikiClient(object):
+    """
+    Client for CheckWiki web interface.
+
+    Keeps a pool of persistent connections, sends mark requests concurrently
+    (up to workers requests at once), retries failed requests with exponential
+    backoff and, if journal file name is given, writes every mark to the
+    journal before sending it: marks which weren't confirmed by the server
+    (for example, because of a crash) are sent again by the next client
+    created with the same journal.
+    """
 
-    params = {"project": PROJECT, "view": "detail", "id": error_num, "title": page_name}
-    urlopen(CHECKWIKI_URL + urlencode(params)).read()
+    def __init__(self, journal=None, workers=MARK_CONCURRENCY, retries=REQUEST_RETRIES,
+                 backoff=REQUEST_BACKOFF):
+        """Initialize client and resend unconfirmed marks from the journal."""
+        self.journal = journal
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self._lock = threading.Lock()
+        self._futures = []
+        self._unconfirmed = Counter()
+
+        if journal is not None and os.path.exists(journal):
+            with open(journal, encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    (sign, error_num, page_name) = line.rstrip("\n").split("\t", 2)
+                    self._unconfirmed[(error_num, page_name)] += 1 if sign == "+" else -1
+            for ((error_num, page_name), count) in list(self._unconfirmed.items()):
+                if count > 0:
+                    self._submit(error_num, page_name)
+
+    def request(self, params, stream=False):
+        """
+        Send GET request with given params to CheckWiki and return
+        requests.Response object. Failed requests are retried.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(CHECKWIKI_URL, params=params, stream=stream,
+                                            timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                return response
+            except requests.RequestException:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+
+    def iter_lines(self, params):
+        """Send GET request with given params and generate lines of the response as they come."""
+        response = self.request(params, stream=True)
+        with response:
+            # CheckWiki doesn't send charset, requests would decode the response as ISO-8859-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                yield line
+
+    def _write_journal(self, sign, error_num, page_name):
+        """Append a line to the journal file; must be called with the lock held."""
+        if self.journal is None:
+            return
+        with open(self.journal, "a", encoding="utf-8") as journal_file:
+            journal_file.write("{}\t{}\t{}\n".format(sign, error_num, page_name))
+
+    def _send_mark(self, error_num, page_name):
+        """Send mark request and confirm it in the journal."""
+        params = {"project": PROJECT, "view": "detail", "id": error_num, "title": page_name}
+        self.request(params).close()
+        with self._lock:
+            self._unconfirmed[(error_num, page_name)] -= 1
+            self._write_journal("-", error_num, page_name)
+
+    def _submit(self, error_num, page_name):
+        """Schedule the mark request."""
+        future = self.executor.submit(self._send_mark, error_num, page_name)
+        with self._lock:
+            self._futures.append(future)
+
+    def mark(self, error_num, page_name):
+        """Mark error as done; request is sent in background (see flush())."""
+        error_num = str(error_num)
+        if error_num == "0":
+            return
+        page_name = page_name.strip()
+        with self._lock:
+            self._unconfirmed[(error_num, page_name)] += 1
+            self._write_journal("+", error_num, page_name)
+        self._submit(error_num, page_name)
+
+    def flush(self):
+        """
+        Wait until all the scheduled marks are sent and compact the journal.
+        Return number of marks which failed even after retries; they are kept
+        in the journal.
+        """
+        with self._lock:
+            (futures, self._futures) = (self._futures, [])
+        failed = 0
+        for future in futures:
+            if future.exception() is not None:
+                failed += 1
+
+        with self._lock:
+            unconfirmed = [(key, count) for (key, count) in self._unconfirmed.items() if count > 0]
+            self._unconfirmed = Counter(dict(unconfirmed))
+            if self.journal is not None:
+                with open(self.journal, "w", encoding="utf-8") as journal_file:
+                    for ((error_num, page_name), count) in unconfirmed:
+                        for _ in range(count):
+                            journal_file.write("+\t{}\t{}\n".format(error_num, page_name))
+        return failed
+
+    def close(self):
+        """Flush the marks and close all the connections."""
+        failed = self.flush()
+        self.executor.shutdown()
+        self.session.close()
+        return failed
+
+CLIENT = None
+
+def get_client():
+    """
+    Return CheckWikiClient used by module functions. It's created on the first
+    call, with MARK_JOURNAL journal, and flushed at exit. You can also assign
+    your own client to CLIENT variable before any requests.
+    """
+    global CLIENT
+    if CLIENT is None:
+        CLIENT = CheckWikiClient(journal=MARK_JOURNAL)
+        atexit.register(CLIENT.flush)
+    return CLIENT
+
+def mark_error_done(error_num, page_name):
+    """
+    Mark error as done in CheckWiki web interface.
+    Request is sent in background, use flush_marks() to wait for it.
+    """
+    get_client().mark(error_num, page_name)
 
 def mark_error_list_done(error_list, page_name):
     """Mark all errors from list as done in CheckWiki web interface."""
     for error_num in error_list:
         mark_error_done(error_num, page_name)
 
+def flush_marks():
+    """Wait until all marks are sent. Return number of failed ones."""
+    if CLIENT is None:
+        return 0
+    return CLIENT.flush()
+
+def parse_page_list(lines):
+    """
+    Generate page titles from the lines of CheckWiki "bots" view as soon as
+    they come; stop at the end of the list.
+    """
+    checkwiki_page = False
+    inside_list = False
+    for line in lines:
+        if not inside_list:
+            if "Check Wikipedia" in line:
+                checkwiki_page = True
+            start = line.find("<pre>")
+            if start == -1:
+                continue
+            if not checkwiki_page:
+                return
+            inside_list = True
+            line = line[start + len("<pre>"):]
+        end = line.find("</pre>")
+        if end != -1:
+            line = line[:end]
+        title = line.strip()
+        if title != "":
+            yield title
+        if end != -1:
+            return
+
 def load_page_list(error_num, offset=0):
-    """Download list of pages with error_num error from CheckWiki server."""
+    """Download one page of the list of pages with error_num error from CheckWiki server."""
     params = {"project": PROJECT, "view": "bots", "id": str(error_num), "offset": str(offset)}
-    data = urlopen(CHECKWIKI_URL + urlencode(params)).read().decode()
-    if not "Check Wikipedia" in data:
-        return []
-    data = re.search(r"<pre>(.*)</pre>", data, flags=re.DOTALL)
-    if data is None:
-        return []
-    data = data.group(1).strip()
-    if data == "":
-        return []
+    return list(parse_page_list(get_client().iter_lines(params)))
+
+def iter_page_list(error_num):
+    """
+    Generate titles of all pages with error_num error from CheckWiki server.
+    The list is downloaded lazily, page by page, and every page is streamed.
+    Note that the list must be read completely before marking its pages as done:
+    marked pages disappear from the list, so the next pages would be shifted.
+    """
+    seen = set()
+    offset = 0
+    previous_first = None
+    while True:
+        params = {"project": PROJECT, "view": "bots", "id": str(error_num), "offset": str(offset)}
+        count = 0
+        new_count = 0
+        first = None
+        for title in parse_page_list(get_client().iter_lines(params)):
+            if first is None:
+                first = title
+            count += 1
+            if title in seen:
+                continue
+            seen.add(title)
+            new_count += 1
+            yield title
+        if count == 0 or (new_count == 0 and first == previous_first):
+            # server returned an empty page or ignored the offset
+            return
+        previous_first = first
+        offset += count
+
+def changed_size(old, new):
+    """Return size (in UTF-8 bytes) of the part of new string which differs from old one."""
+    if old == new:
+        return 0
+    limit = min(len(old), len(new))
+    # common prefix and suffix lengths are found by binary search: slices are compared in C
+    (low, high) = (0, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+    (low, high) = (0, limit - prefix)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:] == new[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return len(new[prefix:len(new) - low].encode("utf-8"))
+
+class RuleTimeout(Exception):
+    """Raised when a fixer works longer than it's allowed by TimeBudget."""
+    pass
+
+def _raise_timeout(signum, frame):
+    """SIGALRM handler for TimeBudget."""
+    #pylint: disable=unused-argument
+    raise RuleTimeout()
+
+class TimeBudget(object):
+    """
+    Context manager which limits the time of every fixer call by limit seconds:
+        with TimeBudget(RULE_TIME_LIMIT) as budget:
+            (text, count) = budget.call(error, text)
+    If the fixer works longer (for example, some regexp backtracks catastrophically
+    on broken markup), RuleTimeout exception is raised from call() method.
+
+    The limit is enforced by SIGALRM timer (regular expressions engine checks signals
+    while matching), so it works only in the main thread and on systems having
+    signal.setitimer(); otherwise fixers are called without any limit.
+    SIGALRM handler and timer set before are restored on exit; the timer is paused
+    inside the block, but the time spent there is subtracted from it.
+    """
+    def __init__(self, limit=RULE_TIME_LIMIT):
+        self.limit = limit
+        self.enabled = (bool(limit) and hasattr(signal, "setitimer") and
+                        threading.current_thread() is threading.main_thread())
+        self.handler = None
+        self.timer = (0, 0)
+        self.started = None
+
+    def __enter__(self):
+        if self.enabled:
+            self.timer = signal.setitimer(signal.ITIMER_REAL, 0)
+            self.started = time.monotonic()
+            self.handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self.handler)
+            (delay, interval) = self.timer
+            if delay > 0:
+                # the timer can't be restored with zero delay, that would disable it
+                delay = max(delay - (time.monotonic() - self.started), 1e-6)
+                signal.setitimer(signal.ITIMER_REAL, delay, interval)
+
+    def call(self, function, *args):
+        """Return function(*args), raise RuleTimeout if it works too long."""
+        if not self.enabled:
+            return function(*args)
+        signal.setitimer(signal.ITIMER_REAL, self.limit)
+        try:
+            return function(*args)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+class FixerStats(object):
+    """
+    Statistics of process_text() calls, accumulated across the run.
+
+    For every fixer from ENABLED_ERRORS it contains wall time, calls count, number of skips
+    (see ERROR_TOKENS and ERROR_TRIGGERS), matches (sum of returned replacements counts)
+    bytes changed (size of the text between the first and the last change) and timeouts
+    (see TimeBudget).
+    For pages it contains count, total time and SLOW_PAGES slowest ones.
+    For LINK_CACHES functions it contains hits and misses of their caches during
+    process_text() calls (approximate if pages are processed in several threads).
+
+    Usage:
+        stats = FixerStats()
+        (text, fixed_errors) = process_text(text, title, stats)
+        ...
+        print(stats.table())
+
+    Instance can be shared between threads; instances collected in other processes
+    can be added with merge() method.
+    """
+    FIELDS = ("time", "calls", "skips", "matches", "bytes", "timeouts")
+
+    def __init__(self, slow_pages=SLOW_PAGES):
+        self.rules = {}
+        self.pages = 0
+        self.time = 0
+        self.slow_pages = slow_pages
+        self.slowest = []
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _rule(self, name):
+        """Return counters list of the fixer (see FIELDS); must be called under the lock."""
+        if name not in self.rules:
+            self.rules[name] = [0] * len(self.FIELDS)
+        return self.rules[name]
+
+    def add_rule(self, name, elapsed=0, matches=0, changed=0, skipped=False, timeout=False):
+        """Add one fixer call (or skip, if skipped is True)."""
+        with self.lock:
+            counters = self._rule(name)
+            if skipped:
+                counters[2] += 1
+                return
+            counters[0] += elapsed
+            counters[1] += 1
+            counters[3] += matches
+            counters[4] += changed
+            if timeout:
+                counters[5] += 1
+
+    def add_page(self, title, elapsed):
+        """Add one processed page."""
+        with self.lock:
+            self.pages += 1
+            self.time += elapsed
+            if self.slow_pages > 0:
+                item = (elapsed, title or "")
+                if len(self.slowest) < self.slow_pages:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+
+    def add_caches(self, caches):
+        """Add {function_name: (hits, misses)} dict of cache counters."""
+        with self.lock:
+            for (name, counters) in caches.items():
+                own = self.caches.setdefault(name, [0, 0])
+                own[0] += counters[0]
+                own[1] += counters[1]
+
+    def merge(self, other):
+        """Add all statistics from another FixerStats instance."""
+        with self.lock:
+            for (name, counters) in other.rules.items():
+                own = self._rule(name)
+                for (index, value) in enumerate(counters):
+                    own[index] += value
+            self.pages += other.pages
+            self.time += other.time
+            for (name, counters) in other.caches.items():
+                own = self.caches.setdefault(name, [0, 0])
+                own[0] += counters[0]
+                own[1] += counters[1]
+            for item in other.slowest:
+                if len(self.slowest) < self.slow_pages:
+                    heapq.heappush(self.slowest, item)
+                elif self.slow_pages > 0:
+                    heapq.heappushpop(self.slowest, item)
+
+    def as_dict(self):
+        """Return statistics as JSON-serializable dict."""
+        with self.lock:
+            return {
+                "pages": self.pages,
+                "time": self.time,
+                "rules": {name: dict(zip(self.FIELDS, counters))
+                          for (name, counters) in self.rules.items()},
+                "slowest": [{"title": title, "time": elapsed}
+                            for (elapsed, title) in sorted(self.slowest, reverse=True)],
+                "caches": {name: {"hits": hits, "misses": misses}
+                           for (name, (hits, misses)) in self.caches.items()}
+            }
+
+    def dump(self, filename):
+        """Write statistics into the file as JSON."""
+        with open(filename, "w", encoding="utf-8") as statsfile:
+            json.dump(self.as_dict(), statsfile, ensure_ascii=False, indent=4, sort_keys=True)
+
+    def table(self):
+        """Return statistics as a text table, the slowest fixers first."""
+        data = self.as_dict()
+        lines = ["{} pages in {:.3f} s".format(data["pages"], data["time"])]
+        lines.append("{:<40} {:>10} {:>8} {:>8} {:>8} {:>10} {:>8}".format(
+            "fixer", "time, ms", "calls", "skips", "matches", "bytes", "timeouts"))
+        rules = sorted(data["rules"].items(), key=lambda x: x[1]["time"], reverse=True)
+        for (name, rule) in rules:
+            lines.append("{:<40} {:>10.2f} {:>8} {:>8} {:>8} {:>10} {:>8}".format(
+                name, rule["time"] * 1000, rule["calls"], rule["skips"],
+                rule["matches"], rule["bytes"], rule["timeouts"]))
+        if data["slowest"]:
+            lines.append("slowest pages:")
+            for page in data["slowest"]:
+                lines.append("    {} - {:.2f} ms".format(page["title"], page["time"] * 1000))
+        if data["caches"]:
+            lines.append("caches:")
+            for (name, cache) in sorted(data["caches"].items()):
+                total = cache["hits"] + cache["misses"]
+                rate = cache["hits"] / total * 100 if total > 0 else 0
+                lines.append("    {} - {} hits, {} misses ({:.1f} %)".format(
+                    name, cache["hits"], cache["misses"], rate))
+        return "\n".join(lines)
+
+def dump_stats(stats, filename=None):
+    """Write statistics into the file as JSON or print it as a table if filename is None."""
+    if filename is None:
+        pywikibot.output(stats.table(), toStdout=True)
     else:
-        return data.split("\n")
+        stats.dump(filename)
 
-def process_text(text, title=None):
+class FixContext(object):
+    """
+    State of one process_text() call, which is passed as the second argument to
+    the fixers taking it (see takes_context()):
+        title - title of the page or None;
+        state - dict fixers can use to share their results (for example,
+            error_051 passes its replacements count to error_053 there);
+        stats - FixerStats instance or None.
+    Every call has its own context, so pages can be fixed in several threads at once.
+    """
+    def __init__(self, title=None, stats=None):
+        self.title = title
+        self.state = {}
+        self.stats = stats
+
+def takes_context(function):
+    """Return True if fixer function takes FixContext as the second argument (see uses_context())."""
+    return getattr(function, "uses_context", False)
+
+def process_text(text, title=None, stats=None, context=None):
     """
     Fix all errors from ENABLED_ERRORS and return (new_text, fixed_errors_list) tuple.
     Ignore text inside comments and some tags:
     <nowiki>, <source>, <tt>, <code>, <pre>, <syntaxhighlight>, <templatedata>
     (see IGNORE_FILTER regexp for full list)
+
+    Fixers from ERROR_TOKENS and ERROR_TRIGGERS are called only if their
+    tokens and at least one of their literals are present in the text (see
+    TextFeatures class).
+
+    If stats (an instance of FixerStats) is passed, time and results of every
+    fixer are added there. Instead of title and stats, FixContext instance can be
+    passed as context parameter; title and stats mustn't be passed along with it.
+
+    Every fixer call is limited by RULE_TIME_LIMIT seconds (see TimeBudget class):
+    if the fixer works longer, it is aborted, its changes are dropped and the page
+    and the fixer are logged.
     """
-    error_048_title_link_in_text.title = title
+    page_start = time.perf_counter()
+    if context is None:
+        context = FixContext(title, stats)
+    elif title is not None or stats is not None:
+        raise ValueError("title and stats must be passed in the context")
+    (title, stats) = (context.title, context.stats)
+    if stats is not None:
+        caches_before = link_cache_info()
 
     (text, ignored) = ignore(text, IGNORE_FILTER)
 
     fixed_errors = []
-    for error in ENABLED_ERRORS:
-        (text, count) = error(text)
-        if count > 0:
-            fixed_errors.append(get_error_num(error))
+    features = TextFeatures(text, TRIGGERS)
+    with TimeBudget(RULE_TIME_LIMIT) as budget:
+        for error in ENABLED_ERRORS:
+            if (error in ERROR_TRIGGERS and not features.has_literals(ERROR_TRIGGERS[error]) or
+                    error in ERROR_TOKENS and not features.has_kinds(ERROR_TOKENS[error])):
+                if stats is not None:
+                    stats.add_rule(error.__name__, skipped=True)
+                continue
+            start = time.perf_counter()
+            try:
+                if takes_context(error):
+                    (new_text, count) = budget.call(error, text, context)
+                else:
+                    (new_text, count) = budget.call(error, text)
+            except RuleTimeout:
+                pywikibot.output("{} - {} exceeded time limit of {} s, skipped".format(
+                    title, error.__name__, RULE_TIME_LIMIT), toStdout=True)
+                if stats is not None:
+                    stats.add_rule(error.__name__, time.perf_counter() - start, timeout=True)
+                continue
+            if stats is not None:
+                elapsed = time.perf_counter() - start
+                stats.add_rule(error.__name__, elapsed, count, changed_size(text, new_text))
+            text = new_text
+            features.update(text)
+            if count > 0:
+                fixed_errors.append(get_error_num(error))
 
     text = deignore(text, ignored)
+    if stats is not None:
+        stats.add_page(title, time.perf_counter() - page_start)
+        caches_after = link_cache_info()
+        stats.add_caches({name: (caches_after[name][0] - hits, caches_after[name][1] - misses)
+                          for (name, (hits, misses)) in caches_before.items()})
     return (text, fixed_errors)
 
-def has_major(fixes_list):
-    """Return True if list, passed as parameter, has at least one major error fix."""
-    return any(fix in MAJOR_ERRORS for fix in fixes_list)
+def get_major_errors(nums):
+    """Return dict just like MAJOR_ERRORS with only the errors from nums list."""
+    return {num: MAJOR_ERRORS[num] for num in nums if num in MAJOR_ERRORS}
 
-def has_minor(fixes_list):
-    """Return True if list, passed as parameter, has at least one minor error fix."""
-    return any(not fix in MAJOR_ERRORS for fix in fixes_list)
+def has_major(fixes_list, major_errors=None):
+    """
+    Return True if list, passed as parameter, has at least one major error fix.
+    major_errors is a dict just like MAJOR_ERRORS, which is used by default.
+    """
+    if major_errors is None:
+        major_errors = MAJOR_ERRORS
+    return any(fix in major_errors for fix in fixes_list)
+
+def has_minor(fixes_list, major_errors=None):
+    """
+    Return True if list, passed as parameter, has at least one minor error fix.
+    major_errors is a dict just like MAJOR_ERRORS, which is used by default.
+    """
+    if major_errors is None:
+        major_errors = MAJOR_ERRORS
+    return any(not fix in major_errors for fix in fixes_list)
 
-def get_comment(fixes_list, extra_comment_parts=None):
+def get_comment(fixes_list, extra_comment_parts=None, major_errors=None):
     """
     Form edit comment from list of fixed errors (in russian language).
 
     Parameters:
         fixes_list - list of fixed errors, for example, returned by process_text function.
         extra_comment_parts - list of strings, which will be written in comma separated list.
+        major_errors - dict just like MAJOR_ERRORS, which is used by default.
     """
     if extra_comment_parts is None:
         comment_parts = []
     else:
         comment_parts = extra_comment_parts
+    if major_errors is None:
+        major_errors = MAJOR_ERRORS
 
     for fix in fixes_list:
-        if fix in MAJOR_ERRORS:
-            comment_parts.append(MAJOR_ERRORS[fix])
+        if fix in major_errors:
+            comment_parts.append(major_errors[fix])
     comment_parts = unique(comment_parts)
 
     comment_halfs = []
     if len(comment_parts) > 0:
         comment_halfs.append(COMMENT_FIX + " " + ", ".join(comment_parts))
-    if has_minor(fixes_list):
+    if has_minor(fixes_list, major_errors):
         comment_halfs.append(COMMENT_MINOR)
 
     comment = "; ".join(comment_halfs)
@@ -1146,6 +2080,178 @@ def get_comment(fixes_list, extra_comment_parts=None):
 
     return COMMENT_PREFIX + comment + "."
 
+def _hash_value(value, digest):
+    """Add code object, frozenset or any other value with stable repr() to the hash."""
+    if isinstance(value, types.CodeType):
+        digest.update(value.co_code)
+        digest.update(repr((value.co_names, value.co_varnames)).encode("utf-8"))
+        for const in value.co_consts:
+            _hash_value(const, digest)
+    elif isinstance(value, (frozenset, set)):
+        # order of the elements depends on the hash seed
+        digest.update(repr(sorted(value, key=repr)).encode("utf-8"))
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+def ruleset_fingerprint():
+    """
+    Return hash of the code of all functions and methods of the classes from this module,
+    masking module and ENABLED_ERRORS list and of the settings they use: cached results
+    of process_text() are valid only for the same fingerprint (see ResultCache).
+    """
+    digest = hashlib.sha1()
+    modules = (__name__, Mask.__module__)
+    values = list(globals().values()) + list(vars(sys.modules[Mask.__module__]).values())
+    for value in list(values):
+        if isinstance(value, type) and value.__module__ in modules:
+            values.extend(vars(value).values())
+    # static and class methods keep the function in __func__, functions with lru_cache are wrapped
+    functions = [getattr(value, "__func__", value) for value in values]
+    functions = [getattr(value, "__wrapped__", value) for value in functions]
+    functions = [value for value in functions if isinstance(value, types.FunctionType)]
+    functions = set(functions + ENABLED_ERRORS)
+    for function in sorted(functions, key=lambda x: (x.__module__, x.__qualname__)):
+        digest.update(function.__qualname__.encode("utf-8"))
+        _hash_value(function.__code__, digest)
+        for value in function.__defaults__ or ():
+            _hash_value(value, digest)
+    settings = (
+        [error.__name__ for error in ENABLED_ERRORS],
+        LOCAL_MINOR_FIXES, MNEMONIC_CODES, CONTROL_CHARACTERS, IGNORE_FILTER.pattern, INTERWIKI,
+        IMAGE, CATEGORY, TEMPLATE, MODULE,
+        FIX_UNSAFE_EXTLINKS, FIX_UNSAFE_MISSING_REFERENCES
+    )
+    digest.update(repr(settings).encode("utf-8"))
+    return digest.hexdigest()
+
+class ResultCache(object):
+    """
+    On-disk (sqlite) cache of process_text() results. For every page it keeps the
+    revision id, fixers fingerprint (see ruleset_fingerprint()) and fixed errors list,
+    so a page which wasn't edited since the last run can be skipped without
+    downloading its text (see skip_cached()).
+    Instance can be shared between threads.
+    """
+    # sqlite allows up to 999 parameters in one query
+    QUERY_SIZE = 500
+
+    def __init__(self, filename):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                title TEXT PRIMARY KEY,
+                revid TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                errors TEXT NOT NULL
+            )""")
+
+    def get(self, titles, fingerprint):
+        """Return {title: (revision_id, fixed_errors_list)} dict of cached results with the fingerprint."""
+        result = {}
+        titles = list(titles)
+        with self.lock:
+            for start in range(0, len(titles), self.QUERY_SIZE):
+                chunk = titles[start:start + self.QUERY_SIZE]
+                query = "SELECT title, revid, errors FROM results WHERE fingerprint = ? AND title IN ({})"
+                query = query.format(", ".join("?" * len(chunk)))
+                for (title, revid, errors) in self.connection.execute(query, [fingerprint] + chunk):
+                    result[title] = (revid, errors.split(",") if errors else [])
+        return result
+
+    def put(self, title, revid, fingerprint, fixed_errors):
+        """Save process_text() result for the revision of the page."""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                    (title, str(revid), fingerprint, ",".join(fixed_errors)))
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+CACHE = None
+
+def get_cache():
+    """Return ResultCache instance for RESULT_CACHE file or None if it's not set."""
+    global CACHE
+    if CACHE is None and RESULT_CACHE is not None:
+        CACHE = ResultCache(RESULT_CACHE)
+    return CACHE
+
+def skip_cached(site, titles, cache, fingerprint, force_minor=False, major_errors=None,
+                groupsize=PRELOAD_GROUPSIZE, page_errors=None):
+    """
+    Generate titles except the ones which have cached result for their latest revision
+    (see ResultCache) and which wouldn't be saved according to this result, force_minor
+    and major_errors parameters. If page_errors ({title: error_numbers_list} dict) is
+    passed, major errors of every page are taken from it instead (see get_major_errors()).
+    Latest revisions ids are requested in batches of groupsize titles, without texts.
+    """
+    titles = iter(titles)
+    while True:
+        batch = [title.strip() for title in itertools.islice(titles, groupsize)]
+        if not batch:
+            return
+        cached = cache.get(batch, fingerprint)
+        latest = load_latest_revids(site, list(cached)) if cached else {}
+        for title in batch:
+            if title in cached and cached[title][0] == latest.get(title):
+                fixed_errors = cached[title][1]
+                if page_errors is not None:
+                    major_errors = get_major_errors(page_errors.get(title, []))
+                if fixed_errors == [] or not (force_minor or has_major(fixed_errors, major_errors)):
+                    continue
+            yield title
+
+def preload_pages(site, titles, groupsize=PRELOAD_GROUPSIZE):
+    """
+    Generate pywikibot.Page objects for the titles with the text and page info
+    already loaded: pages are requested in batches of groupsize titles, one
+    API request (revisions and info props) for every batch.
+    Order of the pages may differ from the order of the titles.
+    """
+    pages = (pywikibot.Page(site, title) for title in titles)
+    return site.preloadpages(pages, groupsize=groupsize)
+
+def load_text(page):
+    """
+    Return the text of the page (an instance of pywikibot.Page) or None if the
+    page doesn't exist or bot is not allowed to edit it.
+    Doesn't make any requests if the page was loaded by preload_pages().
+    """
+    if not page.exists():
+        return None
+    if not page.botMayEdit():
+        return None
+    return page.text
+
+def save_page(page, text, fixed_errors, force_minor=False, mark_needed=True, major_errors=None):
+    """
+    Send text fixed by process_text() function to the server and mark
+    corresponding errors in CheckWiki web interface (if mark_needed is True).
+    major_errors is a dict just like MAJOR_ERRORS, which is used by default.
+    Other parameters are just the same as in process_page() function.
+    Return (success, fixed_errors_list) tuple.
+    """
+    error_value = (False, [])
+    if fixed_errors == []:
+        return error_value
+
+    need_to_fix = force_minor or has_major(fixed_errors, major_errors)
+    if not need_to_fix:
+        return (False, fixed_errors)
+
+    try:
+        page.text = text
+        page.save(get_comment(fixed_errors, major_errors=major_errors))
+        if mark_needed:
+            mark_error_list_done(fixed_errors, page.title())
+    except pywikibot.exceptions.Error:
+        return error_value
+
+    return (True, fixed_errors)
+
 def process_page(page, force_minor=False):
     """
     Fix errors in page and send changes to the server.
@@ -1161,30 +2267,72 @@ def process_page(page, force_minor=False):
     Note: if you've added some additional functions to ENABLED_ERRORS list, make sure that all names
     of them contain error number; otherwise it will not marked as "Done" in CheckWiki project.
     """
-    error_value = (False, [])
-    if not page.exists():
-        return error_value
-    if not page.botMayEdit():
-        return error_value
-
-    text = page.text
+    text = load_text(page)
+    if text is None:
+        return (False, [])
 
     (text, fixed_errors) = process_text(text, page.title())
-    if fixed_errors == []:
-        return error_value
+    return save_page(page, text, fixed_errors, force_minor)
 
-    need_to_fix = force_minor or has_major(fixed_errors)
-    if not need_to_fix:
-        return (False, fixed_errors)
+def _process_text_args(args):
+    """Call process_text() for (text, title) tuple; skip None texts."""
+    (text, title) = args
+    if text is None:
+        return (None, [])
+    return process_text(text, title)
 
-    try:
-        page.text = text
-        page.save(get_comment(fixed_errors))
-        mark_error_list_done(fixed_errors, page.title())
-    except pywikibot.exceptions.Error:
-        return error_value
+def _process_text_stats(args):
+    """
+    Call process_text() for (text, title) tuple with a new FixerStats instance.
+    Return (new_text, fixed_errors_list, stats) tuple; used by worker processes.
+    """
+    (text, title) = args
+    stats = FixerStats()
+    (text, fixed_errors) = process_text(text, title, stats)
+    return (text, fixed_errors, stats)
 
-    return (True, fixed_errors)
+def process_texts(texts, jobs=1, window=None):
+    """
+    Fix errors in many texts using a pool of worker processes.
+
+    Parameters:
+        texts - iterable of (text, title) tuples; text can be None, then it
+            will be skipped and (None, []) tuple will be returned for it;
+        jobs - number of worker processes; if jobs <= 1, texts will be
+            processed in the current process;
+        window - maximum number of texts sent to the workers but not returned
+            yet; by default it's jobs * JOB_WINDOW.
+
+    Generate (new_text, fixed_errors_list) tuples in the same order as texts.
+    The texts iterable is consumed in a separate thread of the current process,
+    so it can download pages while the workers are busy.
+    """
+    if jobs <= 1:
+        for args in texts:
+            yield _process_text_args(args)
+        return
+
+    if window is None:
+        window = jobs * JOB_WINDOW
+    semaphore = threading.Semaphore(window)
+    stopped = False
+
+    def _limit_texts():
+        """Don't let the feeder thread to load more than window texts in advance."""
+        for args in texts:
+            semaphore.acquire()
+            if stopped:
+                return
+            yield args
+
+    with multiprocessing.Pool(jobs) as pool:
+        try:
+            for result in pool.imap(_process_text_args, _limit_texts()):
+                semaphore.release()
+                yield result
+        finally:
+            stopped = True
+            semaphore.release()
 
 def log(title, errlist=None, success=True):
     """Print log line to console, for example, "Portal Stories: Mel - [1, 2, 10] ... ok"."""
@@ -1202,7 +2350,8 @@ def log(title, errlist=None, success=True):
 
     pywikibot.output(title + list_string + " ... " + state, toStdout=True)
 
-def process_list(site, titles, force_minor=False, log_needed=True):
+def process_list(site, titles, force_minor=False, log_needed=True, jobs=1, stats=None,
+                 major_errors=None, page_errors=None):
     """
     Fix errors in every page of the list and sends changes to the server.
     Also marks corresponding errors in CheckWiki web interface.
@@ -1212,24 +2361,109 @@ def process_list(site, titles, force_minor=False, log_needed=True):
         page is an instance of pywikibot.Page.
         force_minor is boolean.
         log_needed is boolean.
+        jobs is a number of worker processes used for fixing (see process_texts()).
+        stats is an instance of FixerStats.
+        major_errors is a dict just like MAJOR_ERRORS, which is used by default.
+        page_errors is a {title: error_numbers_list} dict; if passed, only the errors
+            from the page's list are major for it (see get_major_errors()).
     If force_minor is True, the changes will be sent to the server even if there's no major fixes.
     If log_needed is True, function will be shown fixed errors list for every page.
+    If stats is passed, fixers statistics will be added there; otherwise, if COLLECT_STATS is
+    True, it will be collected for this list and dumped at the end (see dump_stats()).
+
+    Pages are processed by a pipeline: they are loaded in batches, fixed, saved
+    and marked in different threads (see Pipeline class and *_WORKERS constants),
+    so slow saves and CheckWiki requests don't hold up fixing of the next pages.
+    If jobs is 1, pages are loaded and fixed in the current thread.
+    If RESULT_CACHE is set, pages which results are cached for their latest revisions
+    and which wouldn't be saved are not even loaded (see skip_cached()).
 
     Return fixed pages count.
 
     Note: if you've added some additional functions to ENABLED_ERRORS list, make sure that all names
     of them contain error number; otherwise it will not marked as "Done" in CheckWiki project.
     """
-    count = 0
-    for title in titles:
-        (success, errlist) = process_page(pywikibot.Page(site, title), force_minor)
+    saved = []
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+    own_stats = stats is None and COLLECT_STATS
+    if own_stats:
+        stats = FixerStats()
+    cache = get_cache()
+    if cache is not None:
+        fingerprint = ruleset_fingerprint()
+        titles = skip_cached(site, titles, cache, fingerprint, force_minor, major_errors,
+                             page_errors=page_errors)
+
+    def _major_errors(page):
+        """Return major errors dict for the page."""
+        if page_errors is None:
+            return major_errors
+        return get_major_errors(page_errors.get(page.title(), []))
+
+    def _load(page):
+        """Load stage: (page, text) tuple; text is None for pages which can't be fixed."""
+        return (page, load_text(page))
+
+    def _fix(item):
+        """Fix stage: (page, new_text, fixed_errors) tuple."""
+        (page, text) = item
+        args = (text, page.title())
+        if text is None:
+            return (page, None, [])
+        if pool is None:
+            context = FixContext(page.title(), stats)
+            (text, fixed_errors) = process_text(text, context=context)
+        elif stats is None:
+            (text, fixed_errors) = pool.apply(_process_text_args, (args,))
+        else:
+            (text, fixed_errors, page_stats) = pool.apply(_process_text_stats, (args,))
+            stats.merge(page_stats)
+        if cache is not None:
+            cache.put(page.title(), page.latest_revision_id, fingerprint, fixed_errors)
+        return (page, text, fixed_errors)
+
+    def _save(item):
+        """Save stage: (page, success, fixed_errors) tuple."""
+        (page, text, fixed_errors) = item
+        if text is None:
+            return (page, False, [])
+        (success, errlist) = save_page(page, text, fixed_errors, force_minor, False,
+                                       _major_errors(page))
+        return (page, success, errlist)
+
+    def _mark(item):
+        """Mark stage: mark fixed errors as done, write the log."""
+        (page, success, errlist) = item
         if success:
-            count += 1
+            mark_error_list_done(errlist, page.title())
+            saved.append(page)
         if log_needed:
-            log(title, errlist, success)
-    return count
+            log(page.title(), errlist, success)
 
-def process_server(site, num, force_minor=False, log_needed=True):
+    pages = preload_pages(site, titles)
+    if pool is None:
+        # pages are fixed while the source is iterated, that is, in the current thread:
+        # time limit works only in the main thread (see TimeBudget)
+        pipeline = Pipeline(_fix(_load(page)) for page in pages)
+    else:
+        pipeline = Pipeline(pages)
+        pipeline.add_stage(_load)
+        pipeline.add_stage(_fix, workers=jobs)
+    pipeline.add_stage(_save, workers=SAVE_WORKERS)
+    pipeline.add_stage(_mark, workers=MARK_WORKERS)
+    try:
+        pipeline.run()
+    finally:
+        if pool is not None:
+            pool.terminate()
+    flush_marks()
+    if own_stats:
+        dump_stats(stats, STATS_FILE)
+    return len(saved)
+
+def process_server(site, num, force_minor=False, log_needed=True, jobs=1, stats=None):
     """
     Download list from server and fixes pages with current error.
     Also mark corresponding errors in CheckWiki web interface.
@@ -1239,24 +2473,122 @@ def process_server(site, num, force_minor=False, log_needed=True):
         num is a string which contains number of an error.
         force_minor is boolean.
         log_needed is boolean.
+        jobs is a number of worker processes used for fixing (see process_texts()).
+        stats is an instance of FixerStats (see process_list()).
     If force_minor is True, the changes will be sent to the server even if there's no major fixes.
     If log_needed is True, function will be shown fixed errors list for every page.
 
     Return fixed pages count.
     """
-    global MAJOR_ERRORS
-    backup = MAJOR_ERRORS
-    result = 0
-    if num in MAJOR_ERRORS:
-        MAJOR_ERRORS = {num: MAJOR_ERRORS[num]}
-        result = process_list(site, load_page_list(num), force_minor, log_needed)
-    else:
-        MAJOR_ERRORS = {}
-        if force_minor:
-            result = process_list(site, load_page_list(num), force_minor, log_needed)
-    MAJOR_ERRORS = backup
+    # only the error from the list is major for its pages
+    major_errors = get_major_errors([num])
+    if not major_errors and not force_minor:
+        return 0
+    # the list is loaded before processing, see iter_page_list()
+    return process_list(site, list(iter_page_list(num)), force_minor, log_needed, jobs, stats,
+                        major_errors)
+
+def process_server_lists(site, nums, force_minor=False, log_needed=True, jobs=1, stats=None):
+    """
+    Download lists of all errors from nums list from server and fix every page once,
+    even if it's in several lists: errors from the lists of the page are major for it.
+    Also mark corresponding errors in CheckWiki web interface.
+    Other parameters are just the same as in process_server() function.
+    Return fixed pages count.
+    """
+    page_errors = {}
+    for num in nums:
+        if not get_major_errors([num]) and not force_minor:
+            continue
+        for title in iter_page_list(num):
+            # the same page can be listed with different titles
+            title = pywikibot.Page(site, title).title()
+            page_errors.setdefault(title, []).append(num)
+    if log_needed:
+        pywikibot.output("{} pages in {} lists".format(len(page_errors), len(nums)), toStdout=True)
+    return process_list(site, list(page_errors), force_minor, log_needed, jobs, stats,
+                        page_errors=page_errors)
+
+def load_latest_revids(site, titles, groupsize=PRELOAD_GROUPSIZE):
+    """
+    Return {title: latest_revision_id} dict for existing pages from the titles
+    list. Only page info is requested (in batches of groupsize titles), not texts.
+    """
+    result = {}
+    for start in range(0, len(titles), groupsize):
+        parameters = {
+            "action": "query",
+            "prop": "info",
+            "titles": titles[start:start + groupsize]
+        }
+        data = api.Request(site=site, parameters=parameters).submit()
+        # titles are returned in normalized form
+        normalized = {item["to"]: item["from"] for item in data["query"].get("normalized", [])}
+        for info in data["query"]["pages"].values():
+            if "lastrevid" in info:
+                title = normalized.get(info["title"], info["title"])
+                result[title] = str(info["lastrevid"])
     return result
 
+def scan_dump(filename, output=CANDIDATES_FILE, force_minor=False, jobs=1):
+    """
+    Fix errors in every page of the XML dump without saving anything and write
+    the pages which need saving into output file, one line per page:
+        title<TAB>revision_id<TAB>comma-separated list of fixed errors
+    Pages are fixed in jobs worker processes (see process_texts()). Use
+    process_candidates() to fix these pages on the wiki.
+    Other parameters are just the same as in process_list() function.
+    Return candidates count.
+    """
+    dump = xmlreader.XmlDump(filename)
+    entries = deque()
+
+    def _texts():
+        """Generate (text, title) tuples of the pages to be checked."""
+        for entry in dump.parse():
+            if entry.ns not in DUMP_NAMESPACES or entry.isredirect:
+                continue
+            entries.append((entry.title, entry.revisionid))
+            yield (entry.text, entry.title)
+
+    count = 0
+    with open(output, "w", encoding="utf-8") as candidates:
+        for (_, fixed_errors) in process_texts(_texts(), jobs):
+            (title, revid) = entries.popleft()
+            if fixed_errors == [] or not (force_minor or has_major(fixed_errors)):
+                continue
+            candidates.write("{}\t{}\t{}\n".format(title, revid, ",".join(fixed_errors)))
+            count += 1
+    return count
+
+def scan_latest_dump(output=CANDIDATES_FILE, force_minor=False, jobs=1):
+    """Call scan_dump() for the newest ToolForge dump (see autodumpscan.py)."""
+    import autodumpscan
+    date = autodumpscan.get_dump_date()
+    return scan_dump(autodumpscan.FILENAME.format(date=date), output, force_minor, jobs)
+
+def read_candidates(filename):
+    """Generate (title, revision_id, fixed_errors_list) tuples from file written by scan_dump()."""
+    with open(filename, encoding="utf-8") as candidates:
+        for line in candidates:
+            (title, revid, errors) = line.rstrip("\n").split("\t")
+            yield (title, revid, errors.split(","))
+
+def process_candidates(site, filename, force_minor=False, log_needed=True, jobs=1, stats=None):
+    """
+    Fix pages from the file written by scan_dump(): only pages which weren't
+    edited since the dump are loaded and fixed.
+    Parameters are just the same as in process_list() function.
+    Return fixed pages count.
+    """
+    candidates = list(read_candidates(filename))
+    latest = load_latest_revids(site, [title for (title, _, _) in candidates])
+    titles = [title for (title, revid, _) in candidates if latest.get(title) == revid]
+    if log_needed:
+        pywikibot.output("{}: {} of {} pages weren't edited since the dump".format(
+            filename, len(titles), len(candidates)), toStdout=True)
+    return process_list(site, titles, force_minor, log_needed, jobs, stats)
+
 def main():
     """Parse console parameters and fixes corresponding pages."""
     if len(sys.argv) == 1:
@@ -1267,9 +2599,25 @@ def main():
 
     source = "title"
     force_minor = False
+    jobs = 1
+    jobs_expected = False
+    dump_expected = False
     for arg in sys.argv[1:]:
         # keys
-        if arg == "--min":
+        if jobs_expected:
+            jobs = int(arg)
+            jobs_expected = False
+        elif dump_expected:
+            if arg == "latest":
+                scan_latest_dump(force_minor=force_minor, jobs=jobs)
+            else:
+                scan_dump(arg, force_minor=force_minor, jobs=jobs)
+            dump_expected = False
+        elif arg == "--jobs":
+            jobs_expected = True
+        elif arg == "--dump":
+            dump_expected = True
+        elif arg == "--min":
             force_minor = True
         elif arg == "--maj":
             force_minor = False
@@ -1279,16 +2627,21 @@ def main():
             source = "title"
         elif arg == "--s":
             source = "server"
+        elif arg == "--c":
+            source = "candidates"
         elif arg == "--t":
             process_list(site, [TEST_PAGE], force_minor)
         # arguments
         elif source == "file":
             with open(arg, encoding="utf-8") as listfile:
-                process_list(site, list(listfile), force_minor)
+                process_list(site, list(listfile), force_minor, jobs=jobs)
         elif source == "server":
-            process_server(site, arg, force_minor)
+            process_server(site, arg, force_minor, jobs=jobs)
+        elif source == "candidates":
+            process_candidates(site, arg, force_minor, jobs=jobs)
         elif source == "title":
             process_list(site, [arg], force_minor)
+    flush_marks()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,169 @@
+"""
+Benchmark for checkwiki.py: measures process_text() speed on the pages from
+the corpus directory, shows time spent by every fixer and compares results
+with the saved baseline.
+
+The bundled corpus (cwbench directory) is synthetic, not snapshots of real
+articles: pages are random Russian words mixed with the markup the fixers work
+on (links, categories, templates, tags, references, tables) in different
+proportions and sizes; broken_markup.txt is a hand-written set of known errors.
+It is good for comparing runs before and after a change, not for predicting
+speed on real pages; pass a directory with saved real pages via --corpus for
+that.
+
+Usage:
+    python cwbench.py [keys ...]
+Keys:
+    --corpus DIR: directory with *.txt pages [default: CORPUS constant]
+    --repeat N: process every page N times and take the best time [default: 5]
+    --save FILE: save results into FILE as the baseline
+    --compare FILE: compare results with the baseline from FILE; exit with code 1
+         if the whole run or any fixer became slower more than THRESHOLD percent
+    --threshold PCT: override THRESHOLD constant
+For example:
+    python cwbench.py --save baseline.json
+    # change some fixers
+    python cwbench.py --compare baseline.json
+Both runs must be done on the same machine.
+"""
+
+import os
+import sys
+import json
+
+import checkwiki
+
+# synthetic pages, see the module docstring
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cwbench")
+TITLE = "Тест"
+REPEAT = 5
+
+# maximum allowed slowdown in percents
+THRESHOLD = 20
+# fixers faster than that (in seconds per whole corpus) are not compared: their time is mostly noise
+MIN_RULE_TIME = 0.001
+
+def load_corpus(directory=CORPUS):
+    """Return list of (name, text) tuples for every *.txt file from the directory."""
+    result = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(directory, filename), encoding="utf-8") as page:
+                result.append((filename[:-4], page.read()))
+    return result
+
+def run(corpus, repeat=REPEAT):
+    """
+    Process every page of the corpus repeat times.
+    Return results dict:
+        pages - number of pages;
+        bytes - total size of the pages in UTF-8;
+        total - sum of the best process_text() times of every page, in seconds;
+        pages_time - {page name: best time};
+        rules - {fixer name: its time during the best runs}.
+    """
+    result = {
+        "pages": len(corpus),
+        "bytes": sum(len(text.encode("utf-8")) for (_, text) in corpus),
+        "total": 0,
+        "pages_time": {},
+        "rules": {}
+    }
+    for (name, text) in corpus:
+        best = None
+        for _ in range(repeat):
+            stats = checkwiki.FixerStats()
+            checkwiki.process_text(text, TITLE, stats)
+            if best is None or stats.time < best.time:
+                best = stats
+        result["total"] += best.time
+        result["pages_time"][name] = best.time
+        for (rule, counters) in best.as_dict()["rules"].items():
+            result["rules"][rule] = result["rules"].get(rule, 0) + counters["time"]
+    return result
+
+def report(result):
+    """Print results table."""
+    total = result["total"]
+    print("{} pages, {:.1f} KB in {:.3f} s: {:.1f} pages/s, {:.2f} MB/s".format(
+        result["pages"], result["bytes"] / 1024, total,
+        result["pages"] / total, result["bytes"] / total / 1024 / 1024))
+    print()
+    for (name, elapsed) in sorted(result["pages_time"].items()):
+        print("{:<40} {:>10.2f} ms".format(name, elapsed * 1000))
+    print()
+    rules = sorted(result["rules"].items(), key=lambda x: x[1], reverse=True)
+    other = total - sum(elapsed for (_, elapsed) in rules)
+    for (rule, elapsed) in rules + [("(masking, gating, etc)", other)]:
+        print("{:<40} {:>10.2f} ms {:>6.1f} %".format(rule, elapsed * 1000, elapsed / total * 100))
+
+def compare(result, baseline, threshold=THRESHOLD):
+    """
+    Print the difference between the result and the baseline.
+    Return list of names of regressed fixers ("total" if the whole run regressed).
+    """
+    regressed = []
+    limit = 1 + threshold / 100
+
+    def _check(name, old, new):
+        """Print and check one pair of times."""
+        change = (new / old - 1) * 100 if old > 0 else 0
+        if new > old * limit:
+            regressed.append(name)
+            mark = "REGRESSION"
+        else:
+            mark = ""
+        print("{:<40} {:>10.2f} ms {:>10.2f} ms {:>+7.1f} % {}".format(
+            name, old * 1000, new * 1000, change, mark))
+
+    print("{:<40} {:>13} {:>13}".format("", "baseline", "current"))
+    _check("total", baseline["total"], result["total"])
+    for (rule, old) in sorted(baseline["rules"].items()):
+        if rule in result["rules"] and max(old, result["rules"][rule]) >= MIN_RULE_TIME:
+            _check(rule, old, result["rules"][rule])
+    return regressed
+
+def main():
+    """Parse console parameters and run benchmark."""
+    corpus_dir = CORPUS
+    repeat = REPEAT
+    threshold = THRESHOLD
+    save_to = None
+    compare_with = None
+
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == "--corpus":
+            corpus_dir = next(args)
+        elif arg == "--repeat":
+            repeat = int(next(args))
+        elif arg == "--threshold":
+            threshold = float(next(args))
+        elif arg == "--save":
+            save_to = next(args)
+        elif arg == "--compare":
+            compare_with = next(args)
+        else:
+            print(__doc__)
+            return 2
+
+    result = run(load_corpus(corpus_dir), repeat)
+    report(result)
+
+    regressed = []
+    if compare_with is not None:
+        with open(compare_with, encoding="utf-8") as baseline:
+            print()
+            regressed = compare(result, json.load(baseline), threshold)
+    if save_to is not None:
+        with open(save_to, "w", encoding="utf-8") as baseline:
+            json.dump(result, baseline, indent=4, sort_keys=True)
+
+    if regressed:
+        print()
+        print("Regressed more than {} %: {}".format(threshold, ", ".join(regressed)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,18 +5,19 @@ Make sure that checkwiki.py module is available!
 
 Usage:
     python cwtrigger.py path-to-markers datafile
+Fixers statistics of the run are written into datafile.stats.json, results of
+process_text() are cached in datafile.cache, markers verdicts are cached in
+datafile.verdicts.
 """
 
 import re
 import os
 import sys
-from urllib.request import urlopen
 
 import pywikibot
 import checkwiki
 from markers import markall
 
-CHECKWIKI = "http://tools.wmflabs.org/checkwiki/cgi-bin/checkwiki.cgi?project=ruwiki&view=project"
 ERRORS = [
 # MAJOR
     # references:
@@ -59,7 +60,15 @@ def main():
     else:
         prev_date = "0000-00-00"
 
-    datepage = urlopen(CHECKWIKI).read().decode()
+    # marks that were not confirmed because of the crash will be sent on the next run
+    checkwiki.CLIENT = checkwiki.CheckWikiClient(journal=filename + ".marks")
+    # pages which weren't edited since the last run and had nothing to save will be skipped
+    checkwiki.RESULT_CACHE = filename + ".cache"
+    # pages which weren't edited since the last run won't be checked by markers again
+    markall.VERDICT_CACHE = filename + ".verdicts"
+
+    params = {"project": checkwiki.PROJECT, "view": "project"}
+    datepage = checkwiki.get_client().request(params).content.decode()
     cur_date = re.search(r"Last scanned dump (\d{4}-\d{2}-\d{2})", datepage).group(1)
 
     if cur_date > prev_date:
@@ -69,8 +78,12 @@ def main():
         markall.main()
 
         site = pywikibot.Site()
-        for num in ERRORS:
-            checkwiki.process_server(site, num)
+        stats = checkwiki.FixerStats()
+        # every page is fixed once, even if it's listed for several errors
+        checkwiki.process_server_lists(site, ERRORS, stats=stats)
+        checkwiki.dump_stats(stats, filename + ".stats.json")
+
+    checkwiki.CLIENT.close()
 
 if __name__ == "__main__":
     main()
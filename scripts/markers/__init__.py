@@ -1,11 +1,12 @@
 """
-This directory is to hold CheckWiki's marker scripts. Each script downloads
-error list from server, checks one error in the corresponding articles and
-marks all fixed errors as done.
+This directory is to hold CheckWiki's marker scripts. Each script registers
+the check of one error as MARKER (see markengine.py); markall.py downloads
+error lists of all scripts from server, checks every listed article once and
+marks all fixed errors as done. Each script can also be run alone.
 Adapted for ruwiki. Do not use this bot on other wikis!
 
 Usage:
-    python markall.py [path-to-markers]
+    python markall.py [path-to-markers] [--dump PATH]
 
 Make sure that checkwiki.py and user-config.py modules are available.
 """
@@ -1,29 +1,25 @@
 """Marks all fixed errors #104 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, mark_error_done, log
+from markengine import Marker, run_markers
 
 NUMBER = "104"
 REGEXP = r"<ref\s+name=\s*(.*?)\s*(?:group=.*?)?\s*/?>"
 FLAGS = re.I
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    for name in re.findall(REGEXP, text, flags=FLAGS):
+        if re.match(r"^'.*'$|^\".*\"$", name):
+            continue
+        if re.search(r"[\"'/\\=?#>\s]", name):
+            return False
+    return True
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        mark = True
-        for name in re.findall(REGEXP, page.text, flags=FLAGS):
-            if re.match(r"^'.*'$|^\".*\"$", name):
-                continue
-            if re.search(r"[\"'/\\=?#>\s]", name):
-                mark = False
-                break
-        if mark:
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
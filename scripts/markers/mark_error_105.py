@@ -1,29 +1,25 @@
 """Marks all fixed errors #105 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, mark_error_done, log
+from markengine import Marker, run_markers
 
 NUMBER = "105"
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    for line in text.split("\n"):
+        match = re.search(r"==+$", line)
+        if not match:
+            continue
+        if line.startswith(match.group(0)):
+            continue
+        return False
+    return True
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for pagename in load_page_list(NUMBER):
-        page = pywikibot.Page(site, pagename)
-        error = False
-        for line in page.text.split("\n"):
-            match = re.search(r"==+$", line)
-            if not match:
-                continue
-            if line.startswith(match.group(0)):
-                continue
-            error = True
-            break
-        if error:
-            log(pagename, success=False)
-        else:
-            mark_error_done(NUMBER, page.title())
-            log(pagename, success=True)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
@@ -1,22 +1,15 @@
 """Marks all fixed errors #112 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, mark_error_done, log
+from markengine import Marker, run_markers
 
 NUMBER = "112"
 REGEXP = r"[;\s]-(?:moz|webkit|ms)-|data-cx-weight|contenteditable\s?="
 FLAGS = re.I
+MARKER = Marker(NUMBER, regexp=REGEXP, flags=FLAGS)
 
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        if re.search(REGEXP, page.text, flags=FLAGS) is None:
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
@@ -1,21 +1,20 @@
 """Marks all fixed errors #23 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, check_tag_balance, mark_error_done, log
+from checkwiki import check_tag_balance
+from markengine import Marker, run_markers
 
 NUMBER = "23"
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    text = re.sub(r"<nowiki\s*/>", "", text, flags=re.I)
+    return check_tag_balance(text, "nowiki")
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        text = re.sub(r"<nowiki\s*/>", "", page.text, flags=re.I)
-        if check_tag_balance(text, "nowiki"):
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
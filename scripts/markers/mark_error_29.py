@@ -1,21 +1,19 @@
 """Marks all fixed errors #29 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, check_tag_balance, mark_error_done, log
+from checkwiki import check_tag_balance
+from markengine import Marker, run_markers
 
 NUMBER = "29"
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    return check_tag_balance(text, "gallery") and not re.search(r"<gallery\s*/>", text, flags=re.I)
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        text = page.text
-        if check_tag_balance(text, "gallery") and not re.search(r"<gallery\s*/>", text, flags=re.I):
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
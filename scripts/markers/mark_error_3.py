@@ -1,22 +1,20 @@
 """Marks all fixed errors #3 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, mark_error_done, log
+from markengine import Marker, run_markers
 
 NUMBER = "3"
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    return bool(re.search(r"{{(?:[Пп]римечания|[Сс]писок[_ ]примечаний|[Rr]eflist\+?)", text) or
+                re.search(r"<\s*references.*?>", text, flags=re.I) or
+                re.search(r"<\s*ref", text, flags=re.I) is None)
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        if (re.search(r"{{(?:[Пп]римечания|[Сс]писок[_ ]примечаний|[Rr]eflist\+?)", page.text) or
-            re.search(r"<\s*references.*?>", page.text, flags=re.I) or
-            re.search(r"<\s*ref", page.text, flags=re.I) is None):
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
@@ -1,22 +1,20 @@
 """Marks all fixed errors #78 on ruwiki's CheckWikipedia."""
 import re
-import pywikibot
-from checkwiki import load_page_list, mark_error_done, log
+from markengine import Marker, run_markers
 
 NUMBER = "78"
 REGEXP = r"\{\{\s*(?:примечания2?|список примечаний|reflist\+?)(?![^}]*group)|<\s*references"
 FLAGS = re.I
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    return len(re.findall(REGEXP, text, flags=FLAGS)) < 2
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        if len(re.findall(REGEXP, page.text, flags=FLAGS)) < 2:
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,18 @@
 """Marks all fixed errors #94 on ruwiki's CheckWikipedia."""
-import re
-import pywikibot
-from checkwiki import load_page_list, check_tag_balance, mark_error_done, log
+from checkwiki import check_tag_balance
+from markengine import Marker, run_markers
 
 NUMBER = "94"
 
+def is_fixed(text):
+    """Return True if the error is fixed in the text."""
+    return check_tag_balance(text, "ref")
+
+MARKER = Marker(NUMBER, is_fixed)
+
 def main():
     """Main script function."""
-    site = pywikibot.Site()
-    for line in load_page_list(NUMBER):
-        page = pywikibot.Page(site, line)
-        if check_tag_balance(page.text, "ref"):
-            mark_error_done(NUMBER, page.title())
-            log(line, success=True)
-        else:
-            log(line, success=False)
+    run_markers([MARKER])
 
 if __name__ == "__main__":
     main()
@@ -1,25 +1,58 @@
 """
-Executes every mark_error_*.py script from current or given directory.
+Checks errors of every mark_error_*.py script from current or given directory
+at once: every page is loaded only once, even if it's listed for several errors
+(see markengine.py).
 
 Usage:
-    python markall.py [path-to-markers]
+    python markall.py [path-to-markers] [--dump PATH]
+With --dump key pages are checked against the local XML dump first; use
+"latest" as PATH for the newest ToolForge dump.
+Verdicts are cached in VERDICT_CACHE file, if it's set.
 """
 
 import sys
 import os
 import re
 
+# file name of the on-disk cache of markers verdicts, see markengine.VerdictCache
+VERDICT_CACHE = None
+
+def load_markers(directory):
+    """Return list of MARKER objects of every mark_error_*.py script from the directory."""
+    markers = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.match(r"^mark_error_(\d+)\.py$", filename)
+        if match:
+            markers.append((int(match.group(1)), __import__(filename[:-3]).MARKER))
+    return [marker for (_, marker) in sorted(markers, key=lambda x: x[0])]
+
 def main():
     """Main script function."""
-    if len(sys.argv) == 1:
+    args = sys.argv[1:]
+    dump = None
+    if "--dump" in args:
+        index = args.index("--dump")
+        dump = args[index + 1]
+        del args[index:index + 2]
+    if dump == "latest":
+        import autodumpscan
+        dump = autodumpscan.FILENAME.format(date=autodumpscan.get_dump_date())
+
+    if len(args) == 0:
         directory = "."
     else:
-        directory = sys.argv[1]
+        directory = args[0]
         sys.path.append(directory)
-    for filename in os.listdir(directory):
-        if re.match(r"^mark_error_\d+\.py", filename):
-            print("{}:".format(filename))
-            __import__(filename[:-3]).main()
+    # markengine is imported from the markers directory
+    from markengine import run_markers, VerdictCache
+    cache = None if VERDICT_CACHE is None else VerdictCache(VERDICT_CACHE)
+    try:
+        marked = run_markers(load_markers(directory), dump=dump, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    for (number, count) in marked.items():
+        print("#{}: {} pages marked".format(number, count))
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,294 @@
+"""
+Common engine of the marker scripts. Every mark_error_*.py script registers
+its check as MARKER (an instance of Marker class); run_markers() downloads the
+lists of all given markers, loads every page from their union once (in
+batches) and runs all corresponding checks against its text.
+
+Markers with the same regexp and flags are checked once per page (see
+find_errors()).
+
+If a local XML dump is passed, pages are checked against it first and only the
+ones which weren't fixed there or which revision in the dump is older than
+DUMP_MAX_AGE days are loaded from the wiki (see check_dump()).
+
+If VerdictCache is passed, errors which were checked for the latest revision of
+the page on the previous runs are not checked again.
+
+Usage:
+    from markengine import Marker, run_markers
+
+    MARKER = Marker("1", regexp=r"\\{\\{\\s*Template:", flags=re.I)
+
+    def main():
+        run_markers([MARKER])
+"""
+
+import re
+import time
+import types
+import sqlite3
+import hashlib
+import calendar
+
+import pywikibot
+from pywikibot import xmlreader
+from checkwiki import iter_page_list, preload_pages, load_latest_revids, mark_error_done
+from checkwiki import flush_marks, log
+
+# results of the check against the dump are trusted only for the pages which revision
+# in the dump is not older than that number of days
+DUMP_MAX_AGE = 7
+
+class Marker(object):
+    """
+    Check of one CheckWiki error.
+
+    Parameters:
+        number - string with the number of the error;
+        predicate - function, which takes text of the page and returns True if
+            the error is fixed in it;
+        regexp, flags - if predicate is not passed, the error is considered to
+            be fixed if there's no regexp matches in the text.
+    """
+    def __init__(self, number, predicate=None, regexp=None, flags=0):
+        if predicate is None and regexp is None:
+            raise ValueError("either predicate or regexp must be passed")
+        self.number = number
+        self.predicate = predicate
+        self.regexp = regexp
+        self.flags = flags
+        self.compiled = None if regexp is None else re.compile(regexp, flags)
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self):
+        """
+        Return hash of the regexp and flags or of the predicate code, including the
+        code of all functions it calls (for example, checkwiki.check_tag_balance()).
+        """
+        digest = hashlib.sha1()
+        if self.predicate is None:
+            digest.update(repr((self.regexp, self.flags)).encode("utf-8"))
+        else:
+            _hash_function(self.predicate, digest, set())
+        return digest.hexdigest()
+
+    def is_fixed(self, text):
+        """Return True if the error is fixed in the text."""
+        if self.predicate is not None:
+            return self.predicate(text)
+        return self.compiled.search(text) is None
+
+def _iter_codes(code):
+    """Generate the code object and all nested ones (of lambdas, inner functions, etc)."""
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _iter_codes(const)
+
+def _hash_function(function, digest, seen):
+    """
+    Add the code of the function and of all global functions and regexps it refers to,
+    recursively, to the digest. seen is a set of already hashed functions.
+    """
+    # functions with lru_cache are wrapped
+    function = getattr(function, "__wrapped__", function)
+    if function in seen:
+        return
+    seen.add(function)
+    digest.update(function.__qualname__.encode("utf-8"))
+    for code in _iter_codes(function.__code__):
+        consts = [const for const in code.co_consts if not isinstance(const, types.CodeType)]
+        digest.update(code.co_code + repr((consts, code.co_names)).encode("utf-8"))
+        for name in code.co_names:
+            value = function.__globals__.get(name)
+            if isinstance(getattr(value, "__wrapped__", value), types.FunctionType):
+                _hash_function(value, digest, seen)
+            elif isinstance(value, re.Pattern):
+                digest.update(repr((value.pattern, value.flags)).encode("utf-8"))
+
+def find_errors(text, markers):
+    """
+    Return set of numbers of the markers which errors are still present in the text.
+    Markers with the same regexp and flags (for example, 45, 51 and 53) are checked once.
+    """
+    present = set()
+    results = {}
+    for marker in markers:
+        if marker.predicate is None:
+            key = (marker.regexp, marker.flags)
+            if key not in results:
+                results[key] = marker.is_fixed(text)
+            fixed = results[key]
+        else:
+            fixed = marker.is_fixed(text)
+        if not fixed:
+            present.add(marker.number)
+    return present
+
+class VerdictCache(object):
+    """
+    On-disk (sqlite) cache of markers verdicts. For every error number and page it
+    keeps the revision id, marker fingerprint (hash of its check) and the verdict,
+    so the error doesn't need to be checked again while the page isn't edited.
+    """
+    # sqlite allows up to 999 parameters in one query
+    QUERY_SIZE = 500
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS verdicts (
+                number TEXT NOT NULL,
+                title TEXT NOT NULL,
+                revid TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                fixed INTEGER NOT NULL,
+                PRIMARY KEY (number, title)
+            )""")
+
+    def get(self, titles):
+        """Return {(error_number, title): (revision_id, fingerprint, fixed)} dict."""
+        result = {}
+        titles = list(titles)
+        for start in range(0, len(titles), self.QUERY_SIZE):
+            chunk = titles[start:start + self.QUERY_SIZE]
+            query = "SELECT number, title, revid, fingerprint, fixed FROM verdicts WHERE title IN ({})"
+            query = query.format(", ".join("?" * len(chunk)))
+            for (number, title, revid, fingerprint, fixed) in self.connection.execute(query, chunk):
+                result[(number, title)] = (revid, fingerprint, bool(fixed))
+        return result
+
+    def put(self, title, revid, markers, fixed):
+        """Save verdicts of the markers for the revision of the page; fixed is a list of fixed ones."""
+        rows = [(marker.number, title, str(revid), marker.fingerprint, marker in fixed)
+                for marker in markers]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+def load_lists(site, markers):
+    """
+    Download lists of all markers from server.
+    Return {title: markers_list} dict, in the order of the lists.
+    """
+    page_markers = {}
+    for marker in markers:
+        for title in iter_page_list(marker.number):
+            # the same page can be listed with different titles
+            title = pywikibot.Page(site, title).title()
+            page_markers.setdefault(title, [])
+            if marker not in page_markers[title]:
+                page_markers[title].append(marker)
+    return page_markers
+
+def parse_timestamp(timestamp):
+    """Convert MediaWiki timestamp (like "2017-10-01T12:00:00Z") into seconds since the epoch."""
+    return calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+
+def check_dump(filename, page_markers, max_age=DUMP_MAX_AGE):
+    """
+    Check pages from page_markers dict (see load_lists()) against the XML dump.
+    Return {title: (revision_id, fixed_markers_list)} dict for the pages which
+    revision in the dump is not older than max_age days.
+    Dump is parsed only until all the pages are found.
+    """
+    oldest = time.time() - max_age * 24 * 60 * 60
+    result = {}
+    left = set(page_markers)
+    if not left:
+        return result
+    for entry in xmlreader.XmlDump(filename).parse():
+        markers = page_markers.get(entry.title)
+        if markers is None:
+            continue
+        if parse_timestamp(entry.timestamp) >= oldest:
+            present = find_errors(entry.text, markers)
+            fixed = [marker for marker in markers if marker.number not in present]
+            result[entry.title] = (entry.revisionid, fixed)
+        left.discard(entry.title)
+        if not left:
+            break
+    return result
+
+def run_markers(markers, site=None, log_needed=True, dump=None, max_age=DUMP_MAX_AGE,
+                cache=None):
+    """
+    Check all pages from the lists of the markers (every page is loaded once) and
+    mark fixed errors as done. Return {error_number: marked_pages_count} dict.
+
+    If dump (file name of the XML dump) is passed, pages are checked against it
+    first; only the errors which are not fixed in the dump or the pages which
+    revision there is older than max_age days are checked on the wiki.
+
+    If cache (an instance of VerdictCache) is passed, errors which verdicts are
+    cached for the latest revision of the page aren't checked again: fixed ones
+    are just marked, the others are skipped. New verdicts are saved there.
+    """
+    if site is None:
+        site = pywikibot.Site()
+    page_markers = load_lists(site, markers)
+    if log_needed:
+        pywikibot.output("{} pages in {} lists".format(len(page_markers), len(markers)),
+                         toStdout=True)
+
+    marked = {marker.number: 0 for marker in markers}
+
+    def _mark(title, fixed, markers_count):
+        """Mark fixed markers of the page as done and write the log."""
+        for marker in fixed:
+            mark_error_done(marker.number, title)
+            marked[marker.number] += 1
+        if log_needed:
+            log(title, [marker.number for marker in fixed], success=len(fixed) == markers_count)
+
+    if cache is not None:
+        cached = cache.get(page_markers)
+        latest = load_latest_revids(site, sorted(set(title for (_, title) in cached)))
+        left = {}
+        skipped = 0
+        for (title, page_list) in page_markers.items():
+            fixed = []
+            for marker in page_list:
+                verdict = cached.get((marker.number, title))
+                if verdict is None or verdict[:2] != (latest.get(title), marker.fingerprint):
+                    left.setdefault(title, []).append(marker)
+                elif verdict[2]:
+                    fixed.append(marker)
+                else:
+                    skipped += 1
+            if fixed:
+                _mark(title, fixed, len(page_list))
+        if log_needed:
+            pywikibot.output("{} unfixed errors are skipped as cached, {} pages are left".format(
+                skipped, len(left)), toStdout=True)
+        page_markers = left
+
+    if dump is not None:
+        dump_fixed = check_dump(dump, page_markers, max_age)
+        left = {}
+        for (title, page_list) in page_markers.items():
+            (revid, fixed) = dump_fixed.get(title, (None, []))
+            if revid is not None and cache is not None:
+                cache.put(title, revid, page_list, fixed)
+            if fixed:
+                _mark(title, fixed, len(page_list))
+            if len(fixed) < len(page_list):
+                left[title] = [marker for marker in page_list if marker not in fixed]
+        if log_needed:
+            pywikibot.output("{} pages are left after the dump check".format(len(left)),
+                             toStdout=True)
+        page_markers = left
+
+    for page in preload_pages(site, page_markers):
+        title = page.title()
+        page_list = page_markers.get(title, [])
+        present = find_errors(page.text, page_list)
+        fixed = [marker for marker in page_list if marker.number not in present]
+        if cache is not None and page.exists():
+            cache.put(title, page.latest_revision_id, page_list, fixed)
+        _mark(title, fixed, len(page_list))
+    flush_marks()
+    return marked
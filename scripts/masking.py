@@ -0,0 +1,193 @@
+"""
+Protection of text parts (comments, nowiki, math, code, etc) from processing.
+
+Two interfaces are available.
+
+ignore() and deignore() functions replace protected text with special labels
+and restore it back afterwards:
+
+    (text, ignored) = masking.ignore(text)
+    text = re.sub(regexp, replacement, text)
+    text = masking.deignore(text, ignored)
+
+Mask class records protected parts as (start, end) offset spans instead, so
+the text isn't rewritten at all. Its sub(), subn(), search() and finditer()
+methods skip every regexp match touching protected part and keep the spans
+in sync with the new text:
+
+    mask = masking.Mask(text)
+    (text, count) = mask.subn(regexp, replacement, text)
+    (text, count2) = mask.subn(regexp2, replacement2, text)
+
+Note that a match intersecting a protected part is skipped as a whole, while
+ignore() would let it match across the label.
+"""
+
+import re
+from bisect import bisect_right
+
+IGNORE_FILTER = re.compile(r"""(
+    <!--.*?-->|
+
+    <nowiki>.*?</nowiki>|
+    <nowiki\s*/>|
+
+    <math>.*?</math>|
+    <hiero>.*?</hiero>|
+
+    <tt>.*?</tt>|
+    <code>.*?</code>|
+    <pre>.*?</pre>|
+    <source[^>]*>.*?</source>|
+    <syntaxhighlight[^>]*>.*?</syntaxhighlight>|
+
+    <templatedata>.*?</templatedata>|
+    <imagemap>.*?</imagemap>
+)""", re.I | re.DOTALL | re.VERBOSE)
+
+LABEL_PREFIX = "\x01"
+LABEL_SUFFIX = "\x02"
+
+def compile_filter(ignore_filter):
+    """Compile ignore_filter if it is a string with regexp, return it as is otherwise."""
+    if isinstance(ignore_filter, str):
+        return re.compile(ignore_filter, flags=re.I | re.DOTALL)
+    return ignore_filter
+
+def ignore(text, ignore_filter=IGNORE_FILTER):
+    """
+    Replace all text matches regexp with special label.
+
+    Parameters:
+        text - text to be processed;
+        ignore_filter - compiled regular expression or string with regexp.
+
+    Return (new_text, deleted_text_list) tuple.
+    """
+    ignore_filter = compile_filter(ignore_filter)
+
+    ignored = []
+    count = 0
+
+    def _ignore_line(match_obj):
+        """Replace founded text with special label."""
+        #pylint: disable=undefined-variable
+        nonlocal ignored
+        ignored.append(match_obj.group(0))
+
+        nonlocal count
+        old_count = count
+        count += 1
+        return LABEL_PREFIX + str(old_count) + LABEL_SUFFIX
+
+    text = re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _ignore_line, text)
+    text = ignore_filter.sub(_ignore_line, text)
+    return (text, ignored)
+
+def deignore(text, ignored):
+    """
+    Restore the text returned by the ignore() function.
+
+    Parameters:
+        text - text to be processed;
+        ignored - deleted_text_list, returned by the ignore() function.
+
+    Return string.
+    """
+    def _deignore_line(match_obj):
+        """Replace founded label with corresponding text."""
+        index = int(match_obj.group(1))
+        return ignored[index]
+
+    return re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _deignore_line, text)
+
+class Mask(object):
+    """
+    Sorted list of protected (start, end) spans of the text.
+
+    Parameters:
+        text - text to be processed;
+        ignore_filter - compiled regular expression or string with regexp.
+    """
+    def __init__(self, text, ignore_filter=IGNORE_FILTER):
+        ignore_filter = compile_filter(ignore_filter)
+        self.spans = [match.span() for match in ignore_filter.finditer(text)]
+        self.starts = [start for (start, _) in self.spans]
+
+    def __bool__(self):
+        return bool(self.spans)
+
+    def overlaps(self, start, end):
+        """Return True if text[start:end] intersects any protected span."""
+        index = bisect_right(self.starts, start) - 1
+        if index >= 0 and self.spans[index][1] > start:
+            return True
+        index += 1
+        return index < len(self.starts) and self.starts[index] < end
+
+    def is_masked(self, pos):
+        """Return True if the symbol at given position is protected."""
+        return self.overlaps(pos, pos + 1)
+
+    def finditer(self, regexp, text, flags=0):
+        """Iterate over regexp matches which do not intersect protected spans."""
+        if isinstance(regexp, str):
+            regexp = re.compile(regexp, flags)
+        if not self.spans:
+            yield from regexp.finditer(text)
+            return
+        for match in regexp.finditer(text):
+            if not self.overlaps(*match.span()):
+                yield match
+
+    def search(self, regexp, text, flags=0):
+        """Return first regexp match which does not intersect protected spans, or None."""
+        return next(self.finditer(regexp, text, flags), None)
+
+    def subn(self, regexp, replacement, text, flags=0):
+        """
+        Work just as re.subn(regexp, replacement, text, flags=flags), but leave
+        protected spans untouched. Spans are moved according to the new text.
+
+        Return (new_text, replacements_count) tuple.
+        """
+        if isinstance(regexp, str):
+            regexp = re.compile(regexp, flags)
+        if not self.spans:
+            return regexp.subn(replacement, text)
+
+        result = []
+        # (end of the replaced match in old text, total length change so far)
+        shifts = []
+        last = 0
+        delta = 0
+        for match in self.finditer(regexp, text):
+            (start, end) = match.span()
+            if callable(replacement):
+                new = replacement(match)
+            else:
+                new = match.expand(replacement)
+            result.append(text[last:start])
+            result.append(new)
+            last = end
+            delta += len(new) - (end - start)
+            shifts.append((end, delta))
+        if not shifts:
+            return (text, 0)
+        result.append(text[last:])
+
+        spans = []
+        index = 0
+        delta = 0
+        for (start, end) in self.spans:
+            while index < len(shifts) and shifts[index][0] <= start:
+                delta = shifts[index][1]
+                index += 1
+            spans.append((start + delta, end + delta))
+        self.spans = spans
+        self.starts = [start for (start, _) in spans]
+        return ("".join(result), len(shifts))
+
+    def sub(self, regexp, replacement, text, flags=0):
+        """Work just as re.sub(), but leave protected spans untouched."""
+        return self.subn(regexp, replacement, text, flags)[0]
@@ -3,80 +3,12 @@
 import re
 import pywikibot
 
+from masking import ignore, deignore
+
 CATEGORY = "Категория:Википедия:Статьи с источниками из Викиданных"
 TEMPLATE = "Шаблон:Примечания"
 COMMENT = "Исправление отсутствующей секции примечаний."
 
-IGNORE_FILTER = re.compile(r"""(
-    <!--.*?-->|
-
-    <nowiki>.*?</nowiki>|
-    <nowiki\s*/>|
-
-    <math>.*?</math>|
-    <hiero>.*?</hiero>|
-
-    <tt>.*?</tt>|
-    <code>.*?</code>|
-    <pre>.*?</pre>|
-    <source[^>]*>.*?</source>|
-    <syntaxhighlight[^>]*>.*?</syntaxhighlight>|
-
-    <templatedata>.*?</templatedata>|
-    <imagemap>.*?</imagemap>
-)""", re.I | re.DOTALL | re.VERBOSE)
-
-LABEL_PREFIX = "\x01"
-LABEL_SUFFIX = "\x02"
-
-def ignore(text, ignore_filter=IGNORE_FILTER):
-    """
-    Replace all text matches regexp with special label.
-
-    Parameters:
-        text - text to be processed;
-        ignore_filter - compiled regular expression or string with regexp.
-
-    Return (new_text, deleted_text_list) tuple.
-    """
-    if isinstance(ignore_filter, str):
-        ignore_filter = re.compile(ignore_filter, flags=re.I | re.DOTALL)
-
-    ignored = []
-    count = 0
-
-    def _ignore_line(match_obj):
-        """Replace founded text with special label."""
-        #pylint: disable=undefined-variable
-        nonlocal ignored
-        ignored.append(match_obj.group(0))
-
-        nonlocal count
-        old_count = count
-        count += 1
-        return LABEL_PREFIX + str(old_count) + LABEL_SUFFIX
-
-    text = re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _ignore_line, text)
-    text = ignore_filter.sub(_ignore_line, text)
-    return (text, ignored)
-
-def deignore(text, ignored):
-    """
-    Restore the text returned by the ignore() function.
-
-    Parameters:
-        text - text to be processed;
-        ignored - deleted_text_list, returned by the ignore() function.
-
-    Return string.
-    """
-    def _deignore_line(match_obj):
-        """Replace founded label with corresponding text."""
-        index = int(match_obj.group(1))
-        return ignored[index]
-
-    return re.sub(LABEL_PREFIX + r"(\d+)" + LABEL_SUFFIX, _deignore_line, text)
-
 def insert_references(text, last_ref=0):
     """
     Insert references section to the page according to local manual of style.